@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from profiling import profiled
+
+# === Memory-mapped array store ===
+# A store is a directory with one fixed-layout .npy file per array and a
+# meta.json sidecar with everything else (axes, labels, years, sector codes,
+# sexes, units). Opening one reads the sidecar and the array headers only;
+# the arrays come back as read-only memmaps, so a slice pages in just the
+# bytes it touches and nothing is copied until it is computed on.
+#
+#   store/
+#     meta.json        {"labels": {...}, "axes": [...], ...}
+#     annual_sum.npy
+#     annual_count.npy
+#     ...
+#
+# Stores are written to a temporary directory and swapped in whole, so a
+# reader never sees a half-written one.
+meta_file = 'meta.json'
+
+
+def save_store(path, meta, arrays):
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(values), allow_pickle=False)
+    with open(os.path.join(tmp_path, meta_file), 'w') as f:
+        json.dump({'meta': meta, 'arrays': list(arrays)}, f)
+
+    # Directories cannot be replaced atomically: move the old store aside
+    # first. Memmaps still open on it keep reading the old files.
+    old_path = f"{path}.old-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.replace(path, old_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Another writer swapped in the same store in between
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+@profiled('load.store')
+def open_store(path, mmap=True):
+    # meta dict with every array added under its name; mmap=False reads the
+    # arrays into memory instead
+    with open(os.path.join(path, meta_file)) as f:
+        contents = json.load(f)
+    store = contents['meta']
+    for name in contents['arrays']:
+        store[name] = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None,
+                              allow_pickle=False)
+    return store
@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import best_of, count_rows, dataset, environment  # noqa: E402
+from ine_cube import build_source_cube, cube_arrays, cube_backends  # noqa: E402
+from ine_polars import pl  # noqa: E402
+
+# === Cube backend benchmark ===
+# Builds the cube of every source of a synthetic dataset (no cache) with each
+# backend, for the whole table and for one sex, checks that the cubes match
+# and reports the best of BENCH_REPEATS runs per source and selection.
+selections = {'all rows': None, 'one sex': {'Sexo': 'Mujeres'}}
+
+
+def same_cube(a, b):
+    return (a['axes'] == b['axes'] and a['labels'] == b['labels']
+            and all(np.allclose(a[name], b[name], equal_nan=True) for name in cube_arrays if name in a))
+
+
+def run(sources, backends=None):
+    backends = backends or list(cube_backends)
+    results = {}
+    for name, path in sources.items():
+        for selection, where in selections.items():
+            if where and name != 'employment':
+                continue
+            cubes, times = {}, {}
+            for backend in backends:
+                times[backend], cubes[backend] = best_of(
+                    lambda: build_source_cube(path, where=where, cache=False, backend=backend))
+            reference = cubes[backends[0]]
+            key = f"{name} ({selection})"
+            results[key] = {'seconds': times, 'same': all(same_cube(reference, cube) for cube in cubes.values())}
+            print(f"[bench] {key}: " + ', '.join(f"{backend} {seconds:.3f}s" for backend, seconds in times.items())
+                  + ('' if results[key]['same'] else '  CUBES DIFFER'))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the pandas and Polars cube backends.')
+    parser.add_argument('--data-dir', help='existing synthetic dataset (default: generate a new one)')
+    parser.add_argument('--backends', nargs='+', choices=list(cube_backends))
+    parser.add_argument('--output', help='JSON results file (default: print only)')
+    args = parser.parse_args()
+
+    sources = dataset(args.data_dir)
+    results = run(sources, args.backends)
+    report = {'dataset': {'rows': {name: count_rows(path) for name, path in sources.items()}},
+              'environment': dict(environment(), polars=pl and pl.__version__), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"Wrote {args.output}")
@@ -0,0 +1,104 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chart_output  # noqa: E402
+chart_output.use_headless()
+
+from chart_output import save_figure  # noqa: E402
+from common import best_of, count_rows, dataset, environment, repeats  # noqa: E402
+from ine_cube import build_cube  # noqa: E402
+from ine_loader import clean_ine_rows, read_ine_text  # noqa: E402
+from render_matrix import chart_sources, source_fallbacks, task_builders  # noqa: E402
+
+# === Chart pipeline benchmark ===
+# Times every stage of each of the six charts on synthetic INE extracts:
+#   load       read the TSV rows as text
+#   clean      decode the numbers and encode the dimensions
+#   aggregate  build the annual cube and slice out the chart's input
+#   render     draw the figure
+#   save       write it in every requested format
+# Each stage is the best of BENCH_REPEATS runs, and the results go to JSON
+# so runs on growing datasets can be compared.
+
+
+def source_path(sources, name):
+    return sources.get(name) or sources.get(source_fallbacks.get(name))
+
+
+def benchmark_chart(chart, sources, output_dir, formats):
+    stages = dict.fromkeys(('load', 'clean', 'aggregate', 'render', 'save'), 0.0)
+    cubes = {}
+    paths = {name: source_path(sources, name) for name in chart_sources[chart]}
+    for path in dict.fromkeys(paths.values()):
+        seconds, raw = best_of(lambda: read_ine_text(path))
+        stages['load'] += seconds
+        seconds, df = best_of(lambda: clean_ine_rows(raw.copy()))
+        stages['clean'] += seconds
+        seconds, cube = best_of(lambda: build_cube(df))
+        stages['aggregate'] += seconds
+        cubes.update({name: cube for name, p in paths.items() if p == path})
+
+    # The chart's default variant: the first task its builder yields, if any
+    # (the regional charts yield none on a national table)
+    seconds, task = best_of(lambda: next(iter(task_builders[chart](cubes, {}, {})), None))
+    if task is None:
+        return None
+    stages['aggregate'] += seconds
+    plot = getattr(importlib.import_module(task['module']), task['function'])
+
+    import matplotlib.pyplot as plt
+    figures = []
+    stages['render'], _ = best_of(lambda: figures.append(plot(*task['args'])))
+    fig = figures.pop()
+    for extra in figures:
+        plt.close(extra)
+    stages['save'], _ = best_of(lambda: save_figure(fig, task['name'], output_dir, formats, close=False))
+    plt.close(fig)
+    stages['total'] = sum(stages.values())
+    return stages
+
+
+def run(sources, charts=None, formats=None, output_dir=None):
+    charts = charts or list(task_builders)
+    formats = formats or ['png']
+    output_dir = output_dir or tempfile.mkdtemp(prefix='chart-bench-')
+    results = {}
+    for chart in charts:
+        stages = benchmark_chart(chart, sources, output_dir, formats)
+        if stages is None:
+            print(f"[bench] {chart}: skipped, no variant in this dataset")
+            continue
+        results[chart] = stages
+        timings = ', '.join(f"{stage} {seconds:.3f}s" for stage, seconds in results[chart].items())
+        print(f"[bench] {chart}: {timings}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time load, clean, aggregate, render and save for each chart.')
+    parser.add_argument('--data-dir', help='existing synthetic dataset (default: generate a new one)')
+    parser.add_argument('--first-year', type=int, default=2008)
+    parser.add_argument('--last-year', type=int, default=2024)
+    parser.add_argument('--sexes', type=int, default=3, choices=[1, 2, 3])
+    parser.add_argument('--regions', type=int, default=0)
+    parser.add_argument('--charts', nargs='+', choices=list(task_builders))
+    parser.add_argument('--formats', nargs='+', choices=chart_output.supported_formats + tuple(chart_output.output_profiles))
+    parser.add_argument('--output', help='JSON results file (default: print only)')
+    args = parser.parse_args()
+
+    sources = dataset(args.data_dir, args.first_year, args.last_year, args.sexes, args.regions)
+    options = {'first_year': args.first_year, 'last_year': args.last_year,
+               'sexes': args.sexes, 'regions': args.regions,
+               'rows': {name: count_rows(path) for name, path in sources.items()}}
+
+    results = run(sources, args.charts, args.formats)
+    report = {'dataset': options, 'repeats': repeats, 'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"Wrote {args.output}")
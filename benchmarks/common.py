@@ -0,0 +1,48 @@
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic_ine import write_dataset  # noqa: E402
+
+# === Shared benchmark helpers ===
+# Timing, the synthetic dataset every benchmark runs on and the environment
+# recorded next to the results.
+repeats = int(os.environ.get('BENCH_REPEATS', 3))
+dataset_sources = ('employment', 'gva', 'national_accounts', 'employment_regions')
+
+
+def best_of(function):
+    # Best time of BENCH_REPEATS runs, and the last result
+    times, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def dataset(data_dir=None, *args):
+    # Paths by source name of the synthetic dataset in data_dir, written there
+    # first (with write_dataset's arguments) unless it already holds one;
+    # without data_dir a new one goes to a temporary directory
+    if data_dir and os.path.exists(os.path.join(data_dir, 'employment.tsv')):
+        return {name: os.path.join(data_dir, f"{name}.tsv") for name in dataset_sources
+                if os.path.exists(os.path.join(data_dir, f"{name}.tsv"))}
+    return write_dataset(data_dir or tempfile.mkdtemp(prefix='ine-synthetic-'), *args)
+
+
+def count_rows(path):
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f) - 1
+
+
+def environment():
+    import matplotlib
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'matplotlib': matplotlib.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
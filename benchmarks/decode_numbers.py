@@ -0,0 +1,59 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import best_of, repeats  # noqa: E402
+from ine_loader import decode_ine_numbers, parse_ine_tsv  # noqa: E402
+
+# === Benchmark configuration ===
+n_rows = int(os.environ.get('BENCH_ROWS', 1_000_000))
+
+
+def make_values(n, seed=0):
+    # Spanish-formatted values with a sprinkling of '..' and blank cells
+    rng = np.random.default_rng(seed)
+    numbers = rng.uniform(0, 25_000, n)
+    values = [f"{x:,.1f}".replace(',', 'X').replace('.', ',').replace('X', '.') for x in numbers]
+    for i in rng.choice(n, n // 50, replace=False):
+        values[i] = '..' if i % 2 else ''
+    return pd.Series(values, name='Total')
+
+
+# === Current chain, as it was in the chart scripts ===
+def chained_decode(values):
+    return (
+        values
+        .replace('..', np.nan)
+        .replace('', np.nan)
+        .str.replace('.', '', regex=False)
+        .str.replace(',', '.', regex=False)
+        .astype(float)
+    )
+
+
+if __name__ == '__main__':
+    values = make_values(n_rows)
+    tsv = 'Periodo\tTotal\n' + '\n'.join(f"2024T1\t{v}" for v in values) + '\n'
+    raw = tsv.encode('latin1')
+
+    expected = chained_decode(values)
+    assert np.allclose(decode_ine_numbers(values), expected, equal_nan=True)
+    assert np.allclose(parse_ine_tsv(io.BytesIO(raw))['Total'], expected, equal_nan=True)
+
+    results = {
+        'chained str.replace': best_of(lambda: chained_decode(values))[0],
+        'decode_ine_numbers': best_of(lambda: decode_ine_numbers(values))[0],
+        'read_csv (str Total + chain)': best_of(
+            lambda: chained_decode(pd.read_csv(io.BytesIO(raw), sep='\t', encoding='latin1',
+                                               dtype={'Total': str}, keep_default_na=False)['Total']))[0],
+        'parse_ine_tsv (read-time decode)': best_of(lambda: parse_ine_tsv(io.BytesIO(raw)))[0],
+    }
+
+    print(f"=== Decoding {n_rows:,} INE values (best of {repeats}) ===")
+    baseline = results['chained str.replace']
+    for name, seconds in results.items():
+        print(f"{name:<34} {seconds * 1000:9.1f} ms  ({baseline / seconds:4.1f}x vs chain)")
@@ -0,0 +1,138 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sectors import a10_groups, cnae_sections, total_code  # noqa: E402
+
+# === Synthetic INE extracts ===
+# Writes latin-1 TSVs laid out like the INE downloads the chart scripts read:
+#   employment.tsv          Sexo, Unidad, Rama de actividad CNAE 2009, Periodo (2024T1), Total
+#   employment_regions.tsv  as employment.tsv, plus a region column (only with regions)
+#   gva.tsv                 Agregados macroeconómicos, CNAE Agrupación A10, Periodo (2024), Total
+#   national_accounts.tsv   as gva.tsv, plus GDP rows with an empty A10 group
+# Values use the Spanish number format and a share of cells is '..'.
+
+sexes = {'Ambos sexos': 1.0, 'Hombres': 0.54, 'Mujeres': 0.46}
+region_column = 'Comunidades y Ciudades Autónomas'
+regions = [
+    '01 Andalucía', '02 Aragón', '03 Asturias, Principado de', '04 Balears, Illes', '05 Canarias',
+    '06 Cantabria', '07 Castilla y León', '08 Castilla - La Mancha', '09 Cataluña',
+    '10 Comunitat Valenciana', '11 Extremadura', '12 Galicia', '13 Madrid, Comunidad de',
+    '14 Murcia, Región de', '15 Navarra, Comunidad Foral de', '16 País Vasco', '17 Rioja, La',
+    '18 Ceuta', '19 Melilla',
+]
+
+# Rough employment (thousands) per CNAE section and GVA (M€) per A10 group
+section_weights = np.array([800, 40, 2300, 80, 130, 1300, 3000, 1000, 1700, 600, 450,
+                            150, 1000, 1000, 1350, 1350, 1800, 400, 450, 550, 5], dtype=float)
+group_weights = np.array([30, 40, 170, 70, 260, 45, 45, 130, 100, 190, 50], dtype=float) * 1000
+gdp_label = 'Producto interior bruto a precios de mercado'
+gva_label = 'Valor añadido bruto'
+
+
+def spanish_numbers(values, rng, gaps=0.0):
+    # '1.234,5', with a share of cells marked '..' as INE does
+    text = pd.Series(values).map('{:,.1f}'.format).str.translate(str.maketrans(',.', '.,'))
+    text[rng.random(len(text)) < gaps] = '..'
+    return text.to_numpy()
+
+
+def employment_table(first_year, last_year, n_sexes=3, n_regions=0, gaps=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    periods = [f"{y}T{q}" for y in range(first_year, last_year + 1) for q in range(1, 5)]
+    sex_names = list(sexes)[:n_sexes]
+    places = regions[:n_regions] or [None]
+    place_share = rng.dirichlet(np.ones(len(places)) * 5)
+
+    # (sex, place, period, section) values, trend plus seasonality plus noise
+    t = np.arange(len(periods)) / 4
+    trend = (1 + 0.01 * t) * (1 + 0.02 * np.sin(np.arange(len(periods)) * np.pi / 2))
+    values = (np.array([sexes[s] for s in sex_names])[:, None, None, None]
+              * place_share[None, :, None, None]
+              * trend[None, None, :, None]
+              * section_weights[None, None, None, :]
+              * rng.uniform(0.95, 1.05, (len(sex_names), len(places), len(periods), len(section_weights))))
+    totals = values.sum(axis=3, keepdims=True)
+
+    labels = [label for label, _, _ in cnae_sections.values()]
+    index = pd.MultiIndex.from_product([sex_names, places, periods, [total_code] + labels],
+                                       names=['Sexo', region_column, 'Periodo', 'Rama de actividad CNAE 2009'])
+    absolute = np.concatenate([totals, values], axis=3).ravel()
+    shares = np.concatenate([np.full_like(totals, 100.0), 100 * values / totals], axis=3).ravel()
+
+    frames = []
+    for unit, numbers in (('Valor absoluto', absolute), ('Porcentaje', shares)):
+        df = index.to_frame(index=False)
+        df['Unidad'] = unit
+        df['Total'] = spanish_numbers(numbers, rng, gaps)
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    columns = ['Sexo'] + ([region_column] if n_regions else []) + \
+              ['Unidad', 'Rama de actividad CNAE 2009', 'Periodo', 'Total']
+    return df[columns]
+
+
+def gva_table(first_year, last_year, with_gdp=False, gaps=0.0, seed=1):
+    rng = np.random.default_rng(seed)
+    years = np.arange(first_year, last_year + 1)
+    values = (group_weights[None, :] * (1 + 0.03 * (years - first_year))[:, None]
+              * rng.uniform(0.9, 1.1, (len(years), len(group_weights))))
+    labels = [label for label, _, _ in a10_groups.values()]
+    df = pd.DataFrame({
+        'Agregados macroeconómicos': gva_label,
+        'CNAE Agrupación A10': np.tile(labels, len(years)),
+        'Periodo': np.repeat(years, len(labels)).astype(str),
+        'Total': spanish_numbers(values.ravel(), rng, gaps),
+    })
+    if with_gdp:
+        gdp = pd.DataFrame({
+            'Agregados macroeconómicos': gdp_label,
+            'CNAE Agrupación A10': '',
+            'Periodo': years.astype(str),
+            'Total': spanish_numbers(values.sum(axis=1) * 1.1, rng),
+        })
+        df = pd.concat([gdp, df], ignore_index=True).sort_values('Periodo', kind='stable')
+    return df
+
+
+def write_tsv(df, path):
+    df.to_csv(path, sep='\t', index=False, encoding='latin1')
+    return path
+
+
+def write_dataset(directory, first_year=2008, last_year=2024, n_sexes=3, n_regions=0, seed=0):
+    # Writes one extract of every kind and returns their paths by source name;
+    # the national charts always read the national employment table, and
+    # the regional one only feeds the 'employment_regions' source
+    os.makedirs(directory, exist_ok=True)
+    paths = {
+        'employment': write_tsv(employment_table(first_year, last_year, n_sexes, seed=seed),
+                                os.path.join(directory, 'employment.tsv')),
+        'gva': write_tsv(gva_table(first_year - 13, last_year - 1, seed=seed + 1),
+                         os.path.join(directory, 'gva.tsv')),
+        'national_accounts': write_tsv(gva_table(first_year - 13, last_year - 1, with_gdp=True, seed=seed + 1),
+                                       os.path.join(directory, 'national_accounts.tsv')),
+    }
+    if n_regions:
+        paths['employment_regions'] = write_tsv(employment_table(first_year, last_year, n_sexes, n_regions, seed=seed),
+                                                os.path.join(directory, 'employment_regions.tsv'))
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic INE-format TSV extracts.')
+    parser.add_argument('directory', help='output directory')
+    parser.add_argument('--first-year', type=int, default=2008)
+    parser.add_argument('--last-year', type=int, default=2024)
+    parser.add_argument('--sexes', type=int, default=3, choices=[1, 2, 3], help='number of sex breakdowns')
+    parser.add_argument('--regions', type=int, default=0, help='number of regions, 0 for a national table')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_dataset(args.directory, args.first_year, args.last_year, args.sexes, args.regions, args.seed)
+    for name, path in paths.items():
+        print(f"{name:<18} {path}  ({os.path.getsize(path) / 1e6:.1f} MB)")
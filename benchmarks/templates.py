@@ -0,0 +1,76 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chart_output  # noqa: E402
+chart_output.use_headless()
+
+from chart_output import render_chart  # noqa: E402
+from common import count_rows, dataset, environment  # noqa: E402
+from render_matrix import build_tasks, task_builders  # noqa: E402
+
+# === Figure template benchmark ===
+# Renders the same set of chart variants (every sex x threshold x year of
+# the render matrix) twice in this process: once creating every figure from
+# scratch, once reusing one template figure per chart type. Reports the
+# render and save time per variant for both paths, per chart type.
+default_spec = {'sexes': ['Ambos sexos', 'Hombres', 'Mujeres'], 'thresholds': [2, 2.5, 3, 4],
+                'years': list(range(2016, 2025))}
+
+
+def render_all(tasks, output_dir, formats):
+    timings = {}
+    for task in tasks:
+        chart = next(c for c in task_builders if task['name'].startswith(c))
+        plot = getattr(importlib.import_module(task['module']), task['function'])
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # one timing line per variant otherwise
+            render_chart(task['name'], plot, *task['args'], directory=output_dir, formats=formats, close=True)
+        timings.setdefault(chart, []).append(time.perf_counter() - start)
+    return timings
+
+
+def run(sources, charts=None, formats=None, output_dir=None):
+    spec = dict(default_spec, sources=sources, charts=charts or list(task_builders))
+    tasks = build_tasks(spec)
+    formats = formats or ['png']
+    output_dir = output_dir or tempfile.mkdtemp(prefix='template-bench-')
+
+    scratch = render_all(tasks, os.path.join(output_dir, 'scratch'), formats)
+    chart_output.use_templates()
+    templated = render_all(tasks, os.path.join(output_dir, 'templates'), formats)
+
+    results = {}
+    for chart, times in scratch.items():
+        results[chart] = {'variants': len(times), 'scratch_per_variant': sum(times) / len(times),
+                          'template_per_variant': sum(templated[chart]) / len(templated[chart])}
+        results[chart]['speedup'] = results[chart]['scratch_per_variant'] / results[chart]['template_per_variant']
+        print(f"[bench] {chart}: {len(times)} variants, scratch {results[chart]['scratch_per_variant']:.3f}s, "
+              f"template {results[chart]['template_per_variant']:.3f}s per variant "
+              f"({results[chart]['speedup']:.2f}x)")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare fresh figures with reused figure templates.')
+    parser.add_argument('--data-dir', help='existing synthetic dataset (default: generate a new one)')
+    parser.add_argument('--charts', nargs='+', choices=list(task_builders))
+    parser.add_argument('--formats', nargs='+', choices=chart_output.supported_formats + tuple(chart_output.output_profiles))
+    parser.add_argument('--output', help='JSON results file (default: print only)')
+    args = parser.parse_args()
+
+    sources = dataset(args.data_dir)
+    results = run(sources, args.charts, args.formats)
+    report = {'dataset': {'rows': {name: count_rows(path) for name, path in sources.items()}},
+              'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"Wrote {args.output}")
@@ -0,0 +1,269 @@
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from profiling import stage
+
+# === Output configuration ===
+# CHARTS_HEADLESS=1 renders with the Agg backend and never opens a window:
+# every figure is written to CHARTS_OUTPUT_DIR in each of CHARTS_FORMATS
+# (comma separated: png, svg, pdf, or one of the output profiles below) and
+# closed straight away.
+headless = os.environ.get('CHARTS_HEADLESS', '0') == '1'
+output_dir = os.environ.get('CHARTS_OUTPUT_DIR', '.')
+output_formats = [f.strip().lower() for f in os.environ.get('CHARTS_FORMATS', 'png').split(',') if f.strip()]
+supported_formats = ('png', 'svg', 'pdf')
+
+# Output profiles, usable wherever a format is: each one writes
+# <name>-<profile>.<format> at its own DPI. 'palette' writes the PNG with a
+# 256-colour palette, about a third of the size of the full RGBA file and
+# quicker to encode. 'rasterize' draws heavy fill layers (stack polygons,
+# wedges, markers with more than rasterize_vertices points) as an embedded
+# bitmap at the profile's DPI; text, lines, axes and light fills stay vectors.
+output_profiles = {
+    'web': {'format': 'png', 'dpi': 100, 'palette': True},
+    'print': {'format': 'pdf', 'dpi': 300, 'rasterize': True},
+    'slides': {'format': 'svg', 'dpi': 150, 'rasterize': True},
+}
+rasterize_vertices = 1000
+
+# CHARTS_BACKGROUND_SAVE=1 writes files on a separate thread while the next
+# chart is drawn; wait_for_saves() (called by show()) waits for them
+background_saves = os.environ.get('CHARTS_BACKGROUND_SAVE', '0') == '1'
+
+# CHARTS_TEMPLATES=1 (headless only) reuses one figure per chart type across
+# variants, see chart_figure() below
+templates = os.environ.get('CHARTS_TEMPLATES', '0') == '1'
+
+# Must happen before anything imports matplotlib.pyplot, so chart scripts
+# import this module first. The backend goes through MPLBACKEND so that
+# matplotlib itself is only imported once a chart is actually drawn.
+if headless:
+    os.environ['MPLBACKEND'] = 'Agg'
+
+
+def use_headless():
+    global headless
+    headless = True
+    os.environ['MPLBACKEND'] = 'Agg'
+    if 'matplotlib' in sys.modules:
+        sys.modules['matplotlib'].use('Agg')
+
+
+def use_templates():
+    # Environment too, so render workers started afterwards inherit it
+    global templates
+    templates = True
+    os.environ['CHARTS_TEMPLATES'] = '1'
+
+
+def use_background_saves():
+    global background_saves
+    background_saves = True
+    os.environ['CHARTS_BACKGROUND_SAVE'] = '1'
+
+
+def variant_name(chart, **params):
+    parts = [chart] + [str(v).replace(' ', '_') for v in params.values() if v is not None]
+    return '_'.join(parts)
+
+
+# === Figure templates ===
+# When many near-identical variants are drawn, most of the time goes into
+# creating the figure and axes and into tight_layout. With templates on, the
+# figure of each chart type is built once (size, axes and the static
+# scaffold from 'setup': axis labels, tick styling) and kept open; every
+# later variant only removes the previous data artists (stack polygons,
+# wedges, scatter points, text labels, legend) and draws its own. The layout
+# worked out for the first variant is kept as fixed subplot parameters.
+_templates = {}
+
+
+def _clear_variant(fig, ax):
+    for artist in [*ax.collections, *ax.patches, *ax.lines, *ax.texts, *ax.images, *fig.texts]:
+        artist.remove()
+    if ax.get_legend() is not None:
+        ax.get_legend().remove()
+    ax.ignore_existing_data_limits = True
+    ax.autoscale(True)
+
+
+def chart_figure(chart, figsize, setup=None):
+    # (fig, ax) to draw one variant of 'chart' on
+    import matplotlib.pyplot as plt
+    template = _templates.get(chart) if templates and headless else None
+    if template is not None:
+        _wait_for(template['fig'])  # still being written in the background
+        _clear_variant(template['fig'], template['ax'])
+        return template['fig'], template['ax']
+
+    fig, ax = plt.subplots(figsize=figsize)
+    if setup is not None:
+        setup(fig, ax)
+    if templates and headless:
+        _templates[chart] = {'fig': fig, 'ax': ax, 'laid_out': False}
+    return fig, ax
+
+
+def _template_of(fig):
+    return next((t for t in _templates.values() if t['fig'] is fig), None)
+
+
+def fit_layout(fig):
+    # tight_layout, once per template
+    template = _template_of(fig)
+    if template is not None and template['laid_out']:
+        return
+    with stage('render.layout'):
+        fig.tight_layout()
+    if template is not None:
+        template['laid_out'] = True
+
+
+# === Saving ===
+_saver = None
+_pending = {}
+
+
+def _targets(name, directory, formats):
+    # (label, path, profile) for every requested format or profile
+    unknown = [f for f in formats if f not in supported_formats and f not in output_profiles]
+    if unknown:
+        raise ValueError(f"Unsupported chart formats: {', '.join(unknown)}")
+    targets = []
+    for target in formats:
+        if target in supported_formats:
+            targets.append((target, os.path.join(directory, f"{name}.{target}"), {'format': target}))
+        else:
+            profile = output_profiles[target]
+            targets.append((target, os.path.join(directory, f"{name}-{target}.{profile['format']}"), profile))
+    return targets
+
+
+def _vertex_count(artist):
+    paths = artist.get_paths() if hasattr(artist, 'get_paths') else [artist.get_path()]
+    return sum(len(path.vertices) for path in paths)
+
+
+def _heavy_fills(fig):
+    return [artist for ax in fig.axes for artist in [*ax.collections, *ax.patches]
+            if not artist.get_rasterized() and _vertex_count(artist) > rasterize_vertices]
+
+
+def _save_palette_png(fig, path, dpi):
+    # Renders to raw RGBA and lets Pillow write a palette PNG
+    from PIL import Image
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='rgba', dpi=dpi)
+    width, height = (int(size) for size in fig.get_size_inches() * dpi)
+    image = Image.frombuffer('RGBA', (width, height), buffer.getvalue(), 'raw', 'RGBA', 0, 1)
+    image.convert('RGB').quantize(256, method=Image.Quantize.FASTOCTREE).save(path, format='png')
+
+
+def _save(fig, path, profile):
+    options = {'dpi': profile['dpi']} if 'dpi' in profile else {}
+    if profile.get('palette') and profile['format'] == 'png':
+        _save_palette_png(fig, path, profile.get('dpi', fig.dpi))
+        return
+
+    fills = _heavy_fills(fig) if profile.get('rasterize') else []
+    for artist in fills:
+        artist.set_rasterized(True)
+    try:
+        fig.savefig(path, format=profile['format'], **options)
+    finally:
+        for artist in fills:
+            artist.set_rasterized(False)
+
+
+def figure_bytes(fig, target):
+    # One format or profile rendered in memory: (bytes, file format)
+    if target not in supported_formats and target not in output_profiles:
+        raise ValueError(f"Unsupported chart format: {target}")
+    profile = output_profiles.get(target) or {'format': target}
+    buffer = io.BytesIO()
+    _save(fig, buffer, profile)
+    return buffer.getvalue(), profile['format']
+
+
+def close_figure(fig):
+    # Frees a figure unless it is a template kept for the next variant
+    if _template_of(fig) is None:
+        import matplotlib.pyplot as plt
+        plt.close(fig)
+
+
+def _write(fig, name, targets, close):
+    timings = {}
+    for target, path, profile in targets:
+        start = time.perf_counter()
+        with stage(f'save.{target}', name):
+            _save(fig, path, profile)
+        timings[target] = time.perf_counter() - start
+
+    if close:
+        close_figure(fig)
+    return timings
+
+
+def _wait_for(fig):
+    future = _pending.pop(id(fig), None)
+    if future is not None:
+        future.result()
+
+
+def wait_for_saves():
+    # Blocks until every background save has finished; raises the first error
+    while _pending:
+        _pending.pop(next(iter(_pending))).result()
+
+
+def save_figure(fig, name, directory=None, formats=None, close=True, background=None, on_saved=None):
+    # Returns the paths straight away; with background saves they are
+    # written by the saver thread and complete after wait_for_saves()
+    global _saver
+    directory = directory or output_dir
+    targets = _targets(name, directory, formats or output_formats)
+    os.makedirs(directory, exist_ok=True)
+
+    def write():
+        timings = _write(fig, name, targets, close)
+        if on_saved is not None:
+            on_saved(timings)
+        return timings
+
+    if background_saves if background is None else background:
+        _wait_for(fig)
+        if _saver is None:
+            _saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart-save')
+        _pending[id(fig)] = _saver.submit(write)
+    else:
+        write()
+    return [path for _, path, _ in targets]
+
+
+def render_chart(name, plot, *args, directory=None, formats=None, close=None):
+    # Draws one figure, writes it out and prints a single timing line.
+    # Interactive runs keep the figure open for show(); headless runs free it.
+    start = time.perf_counter()
+    with stage('render', name):
+        fig = plot(*args)
+    if fig is None:
+        return []
+    rendered = time.perf_counter() - start
+
+    def report(timings):
+        saves = ', '.join(f"{target} {seconds:.2f}s" for target, seconds in timings.items())
+        print(f"[chart] {name}: render {rendered:.2f}s, save {saves}")
+
+    return save_figure(fig, name, directory, formats, close=headless if close is None else close,
+                       on_saved=report)
+
+
+def show():
+    wait_for_saves()
+    if not headless:
+        import matplotlib.pyplot as plt
+        plt.show()
@@ -0,0 +1,235 @@
+import argparse
+import importlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import chart_output
+import profiling
+chart_output.use_headless()  # the server never opens a window
+
+from chart_output import close_figure, figure_bytes
+from ine_loader import source_fingerprint
+from render_matrix import chart_sources, load_sources, source_fallbacks, task_builders
+
+# === Local chart server ===
+# Serves every chart of the render matrix over HTTP from data kept in memory:
+#
+#   GET /                                   chart types, parameters, formats
+#   GET /<chart>.<format>?sex=&year=&threshold=&part=&resolution=&smoothing=
+#       e.g. /employment_pie.png?sex=Mujeres&year=2023&threshold=3
+#            /gva_over_time.web?part=minor
+#            /employment_over_time.png?resolution=quarterly&smoothing=centred
+#
+# The sources of the JSON spec are reduced to their cubes once at start-up
+# (and again only when a file changes on disk). Rendered images are kept in
+# an LRU cache bounded in bytes, keyed on the chart, its parameters, the
+# format and the fingerprints of the source files, so a repeated request is
+# a dictionary lookup and a miss only costs the drawing.
+cache_mb = float(os.environ.get('CHARTS_SERVER_CACHE_MB', 64))
+content_types = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+parameters = ('sex', 'year', 'threshold', 'part', 'resolution', 'smoothing')
+
+
+class ImageCache:
+    # Least recently used images are dropped once the total size exceeds
+    # max_bytes
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, body, content_type):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key)[0])
+            self.entries[key] = (body, content_type)
+            self.size += len(body)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                self.size -= len(self.entries.popitem(last=False)[1][0])
+
+
+class ChartData:
+    # Cubes of every source in the spec, reloaded when a file changes.
+    # Charts whose sources the spec does not list are left out.
+    def __init__(self, spec):
+        self.sources = spec.get('sources', {})
+        self.backend = spec.get('backend')
+        self.lock = threading.Lock()
+        self.charts = [chart for chart in task_builders
+                       if all(self._path(name) for name in chart_sources[chart])]
+        self.reload()
+
+    def _path(self, name):
+        return self.sources.get(name) or self.sources.get(source_fallbacks.get(name))
+
+    def _stamps(self):
+        stamps = {}
+        for path in dict.fromkeys(self._path(name) for chart in self.charts for name in chart_sources[chart]):
+            stat = os.stat(path)
+            stamps[path] = (stat.st_size, stat.st_mtime_ns)
+        return stamps
+
+    def reload(self):
+        start = time.perf_counter()
+        needed = dict.fromkeys(name for chart in self.charts for name in chart_sources[chart])
+        self.cubes = load_sources(self.sources, needed, backend=self.backend)
+        self.shared = {}
+        self.stamps = self._stamps()
+        self.version = '-'.join(source_fingerprint(path)[:12] for path in sorted(self.stamps))
+        print(f"[server] loaded {len(self.stamps)} sources in {time.perf_counter() - start:.2f}s")
+
+    def current(self):
+        with self.lock:
+            if self._stamps() != self.stamps:
+                self.reload()
+            return self
+
+
+def _number(value):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def chart_task(data, chart, params):
+    # The render-matrix task for one variant, or None when the data has no
+    # such variant
+    spec = {}
+    if 'sex' in params:
+        spec['sexes'] = [params['sex']]
+    if 'year' in params:
+        spec['years'] = [int(params['year'])]
+    if 'threshold' in params:
+        spec['thresholds'] = [_number(params['threshold'])]
+    for key in ('resolution', 'smoothing'):
+        if key in params:
+            spec[key] = params[key]
+    tasks = list(task_builders[chart](data.cubes, spec, data.shared))
+    if 'part' in params:
+        tasks = [task for task in tasks if task['name'].endswith('_' + params['part'])]
+    return tasks[0] if tasks else None
+
+
+class ChartServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, spec, max_bytes):
+        super().__init__(address, ChartRequestHandler)
+        self.data = ChartData(spec)
+        self.images = ImageCache(max_bytes)
+        # matplotlib is not thread-safe: one render at a time, while cache
+        # hits are answered from the other request threads
+        self.render_lock = threading.Lock()
+
+    def render(self, chart, target, params):
+        # An unknown format is refused before anything is drawn
+        if target not in chart_output.supported_formats and target not in chart_output.output_profiles:
+            raise ValueError(f"Unsupported chart format: {target}")
+        data = self.data.current()
+        key = (chart, target, tuple(sorted(params.items())), data.version)
+        cached = self.images.get(key)
+        if cached is not None:
+            return cached + ('hit',)
+
+        with self.render_lock:
+            cached = self.images.get(key)  # drawn while this request waited
+            if cached is not None:
+                return cached + ('hit',)
+            task = chart_task(data, chart, params)
+            if task is None:
+                return None
+            plot = getattr(importlib.import_module(task['module']), task['function'])
+            with profiling.stage('render', task['name']):
+                fig = plot(*task['args'])
+            if fig is None:
+                return None
+            try:
+                body, fmt = figure_bytes(fig, target)
+            finally:
+                close_figure(fig)
+        self.images.put(key, body, content_types[fmt])
+        return body, content_types[fmt], 'miss'
+
+
+class ChartRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        name = url.path.strip('/')
+        if not name:
+            return self._send(200, json.dumps(self._index(), indent=1).encode(), 'application/json')
+
+        chart, _, target = name.rpartition('.')
+        if chart not in self.server.data.charts:
+            return self._error(404, f"Unknown chart: {chart or name}")
+        query = parse_qs(url.query)
+        unknown = [key for key in query if key not in parameters]
+        if unknown:
+            return self._error(400, f"Unknown parameters: {', '.join(unknown)}")
+        params = {key: values[-1] for key, values in query.items()}
+
+        try:
+            result = self.server.render(chart, target, params)
+        except (KeyError, ValueError) as e:
+            return self._error(400, str(e))
+        if result is None:
+            return self._error(404, f"No {chart} chart for {params}")
+        body, content_type, status = result
+        self._send(200, body, content_type, {'X-Chart-Cache': status})
+        print(f"[server] {self.path}: {status} {time.perf_counter() - start:.3f}s")
+
+    def _index(self):
+        return {'charts': [f"/{chart}.<format>" for chart in self.server.data.charts],
+                'parameters': list(parameters),
+                'formats': list(chart_output.supported_formats) + list(chart_output.output_profiles),
+                'data': self.server.data.version}
+
+    def _error(self, code, message):
+        self._send(code, json.dumps({'error': message}).encode(), 'application/json')
+
+    def _send(self, code, body, content_type, headers=None):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one [server] line per chart request instead
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the charts over HTTP from data held in memory.')
+    parser.add_argument('spec', help='JSON spec with the same sources as render_matrix')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--cache-mb', type=float, default=cache_mb, help='image cache size (default: 64)')
+    parser.add_argument('--templates', action='store_true',
+                        help='reuse one figure per chart type (faster misses, fixed layout)')
+    args = parser.parse_args()
+    if args.templates:
+        chart_output.use_templates()
+
+    with open(args.spec) as f:
+        server = ChartServer((args.host, args.port), json.load(f), int(args.cache_mb * (1 << 20)))
+    print(f"[server] http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
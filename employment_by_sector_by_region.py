@@ -0,0 +1,108 @@
+import re
+
+import numpy as np
+from chart_output import render_chart, show, variant_name  # picks the backend before pyplot loads
+from ine_cube import annual_frames, load_ine_cube, national_region, region_axis
+from profiling import profiled
+from sectors import sector_color, total_code, translate_sector
+from small_multiples import pages, plot_small_multiples
+
+# === Configuration ===
+file_path = '[file path]'
+selected_sex = 'Ambos sexos'
+selected_year = None  # None picks the latest year in the file
+regions_per_figure = None  # e.g. 10 to split the regions over several figures
+
+sex_title_map = {
+    'Mujeres': 'Women',
+    'Hombres': 'Men',
+    'Ambos sexos': 'Both sexes'
+}
+
+
+# === Every region's annual sector averages, from one slice of the cube ===
+@profiled('aggregate.slice')
+def region_sector_means(cube, sex):
+    axis = region_axis(cube)
+    if axis is None:
+        raise ValueError("The table has no region column")
+    selection = {'Sexo': sex}
+    if 'Unidad' in cube['axes']:
+        selection['Unidad'] = 'Valor absoluto'
+
+    # The national total would flatten every shared axis: regions only
+    frames = annual_frames(cube, axis, **selection)
+    frames.pop(national_region, None)
+    return {region: frame.drop(columns=total_code, errors='ignore') for region, frame in frames.items()}
+
+
+def region_name(region):
+    return re.sub(r'^\d+\s+', '', str(region))  # '01 Andalucía' -> 'Andalucía'
+
+
+def sector_order(frames):
+    # Largest sectors first, the same order and colours in every panel
+    totals = sum(frame.mean() for frame in frames.values())
+    return totals.sort_values(ascending=False).index
+
+
+def _legend(order):
+    return {translate_sector(code): sector_color(code) for code in order}
+
+
+# === Shares by sector over time, one panel per region ===
+def plot_regions_over_time(frames, sex=selected_sex):
+    order = sector_order(frames)
+    colors = [sector_color(code) for code in order]
+
+    def draw(ax, region, frame):
+        frame = frame.reindex(columns=order).fillna(0)
+        shares = frame.divide(frame.sum(axis=1), axis=0) * 100
+        ax.stackplot(shares.index, shares.values.T, colors=colors, linewidth=0)
+        ax.set_xlim(shares.index[0], shares.index[-1])
+        ax.set_ylim(0, 100)
+
+    panels = {region_name(region): frame for region, frame in frames.items()}
+    return plot_small_multiples(
+        panels, draw, f"Employment by Sector and Region, Share of Total (%) - {sex_title_map.get(sex, sex)}",
+        legend=_legend(order))
+
+
+# === Sector mix of one year, one pie per region ===
+def plot_regions_pie(frames, sex=selected_sex, year=None):
+    order = sector_order(frames)
+
+    def draw(ax, region, row):
+        row = row.reindex(order).dropna()
+        ax.pie(row.values, colors=[sector_color(code) for code in row.index], startangle=90,
+               counterclock=False, wedgeprops={'linewidth': 0})
+
+    panels = {}
+    for region, frame in frames.items():
+        if year in frame.index:
+            panels[region_name(region)] = frame.loc[year]
+    if not panels:
+        print(f"No regional data for {year}")
+        return None
+    return plot_small_multiples(
+        panels, draw, f"Employment by Sector and Region ({sex_title_map.get(sex, sex)}, Annual Average, {year})",
+        legend=_legend(order), ncols=5, panel_size=(2.6, 2.6), sharex=False, sharey=False)
+
+
+def latest_year(frames):
+    return int(np.max([frame.index.max() for frame in frames.values()]))
+
+
+if __name__ == '__main__':
+    # === One load and one slice for every region ===
+    cube = load_ine_cube(file_path, where={'Sexo': selected_sex, 'Unidad': 'Valor absoluto'})
+    frames = region_sector_means(cube, selected_sex)
+    year = selected_year or latest_year(frames)
+
+    for page, chunk in enumerate(pages(frames, regions_per_figure), start=1):
+        suffix = page if regions_per_figure else None
+        render_chart(variant_name('employment_regions_over_time', sex=selected_sex, page=suffix),
+                     plot_regions_over_time, chunk, selected_sex)
+        render_chart(variant_name('employment_regions_pie', sex=selected_sex, year=year, page=suffix),
+                     plot_regions_pie, chunk, selected_sex, year)
+    show()
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+import profiling
+from render_matrix import load_sources
+import employment_by_sector_by_sex as employment_pie
+import employment_by_sector_by_sex_over_time as employment_over_time
+import gva_by_sector_over_time as gva_over_time
+from gva_employment_panel import build_panel, panel_table
+
+# === Data-only export ===
+# Writes the tables behind the charts without drawing anything: none of the
+# modules above import matplotlib until a plot function runs, so this never
+# loads it. Takes the same JSON spec as render_matrix ('sources', 'sexes',
+# 'years'); 'tables', 'output_dir' and 'formats' (csv, json, parquet) pick
+# what is written where.
+
+table_sources = {
+    'employment_by_sector': ['employment'],
+    'employment_shares': ['employment_shares', 'employment'],
+    'gva_by_sector': ['gva'],
+    'productivity': ['national_accounts', 'employment'],
+}
+table_formats = ('csv', 'json', 'parquet')
+
+
+def _sexes(cube, spec):
+    return spec.get('sexes') or cube['labels']['Sexo']
+
+
+# === One builder per table, each returning a long frame ===
+def employment_by_sector_table(cubes, spec):
+    cube = cubes['employment']
+    frames = {sex: employment_pie.sex_sector_means(cube, sex).stack().rename('Employment')
+              for sex in _sexes(cube, spec)}
+    return pd.concat(frames, names=['Sexo']).reset_index()
+
+
+def employment_shares_table(cubes, spec):
+    frames = {}
+    for sex in _sexes(cubes['employment_shares'], spec):
+        pivot_abs_df, pivot_pct_df = employment_over_time.sex_pivots(
+            cubes['employment_shares'], cubes['employment'], sex)
+        frames[sex] = pd.DataFrame({'Share': pivot_pct_df.stack(), 'Employment': pivot_abs_df.stack()})
+    return pd.concat(frames, names=['Sexo']).reset_index()
+
+
+def gva_by_sector_table(cubes, spec):
+    pivot_abs, pivot_pct = gva_over_time.gva_pivots(cubes['gva'])
+    return pd.DataFrame({'GVA': pivot_abs.stack(), 'Share': pivot_pct.stack()}).reset_index()
+
+
+def productivity_table(cubes, spec):
+    panel = build_panel(cubes['national_accounts'], cubes['employment'], _sexes(cubes['employment'], spec))
+    df = panel_table(panel)
+    if spec.get('years'):
+        df = df[df['Year'].isin([int(year) for year in spec['years']])].reset_index(drop=True)
+    return df
+
+
+table_builders = {
+    'employment_by_sector': employment_by_sector_table,
+    'employment_shares': employment_shares_table,
+    'gva_by_sector': gva_by_sector_table,
+    'productivity': productivity_table,
+}
+
+
+# === Writing ===
+def write_table(df, path, fmt):
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+    elif fmt == 'json':
+        df.to_json(path, orient='records', force_ascii=False, indent=1)
+    elif fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Unsupported table format: {fmt}")
+
+
+def export(spec):
+    tables = spec.get('tables') or list(table_builders)
+    formats = spec.get('formats') or ['csv']
+    unknown = [t for t in tables if t not in table_builders] + [f for f in formats if f not in table_formats]
+    if unknown:
+        raise ValueError(f"Unknown tables or formats: {', '.join(unknown)}")
+
+    start = time.perf_counter()
+    needed = dict.fromkeys(name for table in tables for name in table_sources[table])
+    cubes = load_sources(spec.get('sources', {}), needed, spec.get('sexes'), spec.get('backend'))
+
+    output_dir = spec.get('output_dir', 'tables')
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for table in tables:
+        df = table_builders[table](cubes, spec)
+        for fmt in formats:
+            path = os.path.join(output_dir, f"{table}.{fmt}")
+            with profiling.stage(f'save.{fmt}', table) as s:
+                write_table(df, path, fmt)
+                s.count(len(df))
+            written.append(path)
+
+    print(f"Wrote {len(written)} files in {time.perf_counter() - start:.2f}s")
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the tables behind the charts, without plotting.')
+    parser.add_argument('spec', help='JSON spec with the same sources as render_matrix')
+    parser.add_argument('--tables', nargs='+', choices=list(table_builders), help='tables to write (default: all)')
+    parser.add_argument('--formats', nargs='+', choices=table_formats, help='output formats (default: csv)')
+    parser.add_argument('--output-dir', help='directory for the tables (default: tables)')
+    parser.add_argument('--profile', nargs='?', const='', metavar='REPORT',
+                        help='time each stage; optional JSON report path')
+    args = parser.parse_args()
+    if args.profile is not None:
+        profiling.enable(report=args.profile or None)
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    for key in ('tables', 'formats', 'output_dir'):
+        if getattr(args, key):
+            spec[key] = getattr(args, key)
+    export(spec)
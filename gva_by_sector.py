@@ -1,97 +1,68 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+from chart_output import chart_figure, render_chart, show  # picks the backend before pyplot loads
+from gva_employment_panel import gva_selection
+from ine_cube import annual_frame, load_ine_cube
+from profiling import profiled
+from sectors import a10_groups, sector_color, translate_sector
 
 # === File path ===
 file_path = '[file path]'
+selected_year = None  # None picks the latest year in the file
 
-# === Load and clean data ===
-df = pd.read_csv(file_path, sep='\t', encoding='latin1')
-df = df[df['CNAE Agrupación A10'].notna() & (df['CNAE Agrupación A10'] != '')]
+# === Colour for groups missing from the shared dictionary ===
+default_color = '#B0B0B0'
 
-df = df.rename(columns={
-    'CNAE Agrupación A10': 'Sector',
-    'Periodo': 'Year',
-    'Total': 'VAB'
-})
-df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
-df['VAB'] = (
-    df['VAB'].astype(str)
-    .str.replace('.', '', regex=False)
-    .str.replace(',', '.', regex=False)
-    .astype(float)
-)
 
-# === Sector translations ===
-sector_name_dict = {
-    'A Agricultura, ganadería, silvicultura y pesca': 'Agriculture & Fishing',
-    'BDE Industrias extractivas; suministro de energía eléctrica, gas, vapor y aire acondicionado; suministro de agua, actividades de saneamiento, gestión de residuos y descontaminación': 'Extractive, Energy, Water & Waste',
-    'C Industria manufacturera': 'Manufacturing',
-    'F Construcción': 'Construction',
-    'GHI Comercio al por mayor y al por menor; reparación de vehículos de motor y motocicletas; transporte y almacenamiento; hostelería': 'Trade, Transport & Hospitality',
-    'J Información y comunicaciones': 'Information & Comms',
-    'K Actividades financieras y de seguros': 'Finance & Insurance',
-    'L Actividades inmobiliarias': 'Real Estate',
-    'MN Actividades profesionales, científicas y técnicas; actividades administrativas y servicios auxiliares': 'Professional & Admin Services',
-    'OPQ Administración pública y defensa; seguridad social obligatoria; educación; actividades sanitarias y de servicios sociales': 'Public Services (Admin, Education, Health)',
-    'RSTU Actividades artísticas, recreativas y de entretenimiento; otras actividades de servicios; actividades de los hogares como empleadores de personal doméstico; actividades de los hogares como productores de bienes y servicios para uso propio': 'Arts, Other & Household Services'
-}
+# === GVA of every year and sector, sliced from the cube ===
+@profiled('aggregate.slice')
+def annual_sector_vab(cube):
+    vab = annual_frame(cube, how='sum', **gva_selection(cube))
 
-# === Color palette ===
-sector_color_dict = {
-    'Agriculture & Fishing': '#8FBC8F',
-    'Extractive, Energy, Water & Waste': '#DAA520',
-    'Manufacturing': '#4682B4',
-    'Construction': '#D2691E',
-    'Trade, Transport & Hospitality': '#FFD700',
-    'Information & Comms': '#00CED1',
-    'Finance & Insurance': '#000080',
-    'Real Estate': '#BC8F8F',
-    'Professional & Admin Services': '#9932CC',
-    'Public Services (Admin, Education, Health)': '#2E8B57',
-    'Arts, Other & Household Services': '#DB7093'
-}
-default_color = '#B0B0B0'
+    # === Keep known A10 groups ===
+    return vab[[code for code in vab.columns if code in a10_groups]]
+
+
+def plot_gva_pie(sector_vab, year):
+    import matplotlib.colors as mcolors
+
+    # === Prepare data for pie chart ===
+    sector_vab = sector_vab.sort_values(ascending=False)
+    colors = [sector_color(code, a10_groups, default_color) for code in sector_vab.index]
+    labels = [translate_sector(code, a10_groups) for code in sector_vab.index]
 
-# === Filter latest year ===
-latest_year = df['Year'].max()
-latest_df = df[df['Year'] == latest_year].copy()
+    # === Plot ===
+    fig, ax = chart_figure('gva_pie', (16, 16))
+    wedges, texts, autotexts = ax.pie(
+        sector_vab,
+        labels=labels,
+        colors=colors,
+        autopct='%.1f%%',
+        startangle=90,
+        counterclock=False,
+        labeldistance=1.1,
+        textprops={'fontsize': 20}
+    )
 
-# === Map names ===
-latest_df['Sector'] = latest_df['Sector'].map(sector_name_dict)
-latest_df = latest_df.dropna(subset=['Sector'])
+    # Move percentage labels closer to the center and adjust color for readability
+    for wedge, autotext in zip(wedges, autotexts):
+        autotext.set_fontsize(20)
+        autotext.set_position((1.2 * autotext.get_position()[0], 1.2 * autotext.get_position()[1]))
+        rgb = mcolors.to_rgb(wedge.get_facecolor())
+        brightness = (0.299*rgb[0] + 0.587*rgb[1] + 0.114*rgb[2])
+        autotext.set_color('white' if brightness < 0.5 else 'black')
 
-# === Prepare data for pie chart ===
-latest_df = latest_df.groupby('Sector')['VAB'].sum().sort_values(ascending=False)
-colors = [sector_color_dict.get(sector, default_color) for sector in latest_df.index]
+    ax.set_title(f'GVA by Sector in Spain ({year})', fontsize=24, pad=4) # Reduce pad to get closer to circle
+    ax.axis('equal')  # ensure circle
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
 
-# === Plot ===
-fig, ax = plt.subplots(figsize=(16, 16))
-wedges, texts, autotexts = ax.pie(
-    latest_df,
-    labels=latest_df.index,
-    colors=colors,
-    autopct='%.1f%%',
-    startangle=90,
-    counterclock=False,
-    labeldistance=1.1,
-    textprops={'fontsize': 20}
-)
+    fig.subplots_adjust(top=0.95)  ## fine-tune title position
+    return fig
 
-# Move percentage labels closer to the center and adjust color for readability
-import matplotlib.colors as mcolors
-for wedge, autotext in zip(wedges, autotexts):
-    autotext.set_fontsize(20)
-    autotext.set_position((1.2 * autotext.get_position()[0], 1.2 * autotext.get_position()[1]))
-    rgb = mcolors.to_rgb(wedge.get_facecolor())
-    brightness = (0.299*rgb[0] + 0.587*rgb[1] + 0.114*rgb[2])
-    autotext.set_color('white' if brightness < 0.5 else 'black')
 
-    
-ax.set_title(f'GVA by Sector in Spain ({latest_year})', fontsize=24, pad=4) # Reduce pad to get closer to circle
-ax.axis('equal')  # ensure circle
-ax.spines['top'].set_visible(False)
-ax.spines['right'].set_visible(False)
+if __name__ == '__main__':
+    sector_vab = annual_sector_vab(load_ine_cube(file_path))
 
-plt.subplots_adjust(top=0.95)  ## fine-tune title position
-#plt.savefig('gdp_pie_latest.png')
-plt.show()
+    # === Filter latest year ===
+    year = selected_year or sector_vab.index.max()
+    render_chart('gdp_pie_latest', plot_gva_pie, sector_vab.loc[year].dropna(), year)
+    show()
@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from array_store import open_store, save_store
+from ine_cube import annual_frame, load_ine_cubes
+from ine_loader import cache_dir, cache_enabled, cache_path, selection_key, source_fingerprint
+from profiling import profiled
+from sectors import align_codes, group_codes, group_labels, sections_to_groups
+
+# === GVA / employment panel ===
+# GVA, employment and GVA per worker for every year and A10 group (and sex
+# on the employment side), as arrays aligned on the years of the national
+# accounts. Every year's scatter is a slice of it, and the panel is cached
+# on the content of both sources as a memory-mapped array store.
+#
+# {
+#   'years': [...], 'sexes': [...], 'sectors': group_codes,
+#   'gva': float array (year, sector), M€,
+#   'employment': float array (year, sex, sector), annual average in thousands,
+#   'productivity': float array (year, sex, sector), € thousands per worker,
+# }
+
+# Bump whenever the layout above changes so stale panels are rebuilt
+panel_version = 1
+panel_arrays = ('gva', 'employment', 'productivity')
+aggregate_axis = 'Agregados macroeconómicos'
+gva_aggregate = 'Valor añadido bruto'
+
+
+def gva_selection(cube):
+    # National accounts tables also hold GDP and other aggregates; GVA by
+    # sector is the 'Valor añadido bruto' slice of them
+    return {aggregate_axis: gva_aggregate} if aggregate_axis in cube['axes'] else {}
+
+
+@profiled('aggregate.slice')
+def gdp_by_sector(cube):
+    # GVA by year, one column per A10 group in dictionary order
+    gdp = annual_frame(cube, how='sum', **gva_selection(cube))
+    return pd.DataFrame(align_codes(gdp.to_numpy(), gdp.columns, group_codes),
+                        index=gdp.index, columns=pd.Index(group_codes, name='Sector'))
+
+
+@profiled('aggregate.slice')
+def employment_by_sector(cube, sex):
+    # Annual average employment by year and A10 group: each CNAE section's
+    # annual mean, added up into its group
+    means = annual_frame(cube, Sexo=sex, Unidad='Valor absoluto')
+    return pd.DataFrame(sections_to_groups(means.to_numpy(), means.columns),
+                        index=means.index, columns=pd.Index(group_codes, name='Sector'))
+
+
+@profiled('aggregate.panel')
+def build_panel(gva_cube, employment_cube, sexes=None):
+    gdp = gdp_by_sector(gva_cube)
+    sexes = list(sexes or employment_cube['labels']['Sexo'])
+    years = gdp.index
+
+    # Employment of years the employment table does not cover stays NaN
+    employment = np.stack([employment_by_sector(employment_cube, sex).reindex(years).to_numpy()
+                           for sex in sexes], axis=1)
+    gva = gdp.to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        productivity = ((gva[:, None, :] * 1e6) / (employment * 1e3)) / 1e3
+    return {'years': [int(y) for y in years], 'sexes': sexes, 'sectors': list(group_codes),
+            'gva': gva, 'employment': employment, 'productivity': productivity}
+
+
+# === Slicing ===
+def panel_frame(panel, year, sex):
+    # One year and sex as the frame the scatter charts draw: sectors with
+    # both GVA and employment only
+    if int(year) not in panel['years'] or sex not in panel['sexes']:
+        raise KeyError(f"No GVA and employment for {sex}, {year}")
+    y, s = panel['years'].index(int(year)), panel['sexes'].index(sex)
+    gva = panel['gva'][y]
+    employment = panel['employment'][y, s]
+    present = np.flatnonzero(~np.isnan(gva) & ~np.isnan(employment))
+
+    return pd.DataFrame({
+        'Sector': np.take(panel['sectors'], present),
+        'GDP': gva[present],
+        'Employment': employment[present],
+        'GDP_Billions': gva[present] / 1000,
+        'Sector Label': group_labels[present],
+        'GDP_per_worker_thousands': panel['productivity'][y, s, present],
+    })
+
+
+def productivity_frame(panel, sex):
+    # Year x A10 group GVA per worker, plus the whole economy
+    s = panel['sexes'].index(sex)
+    frame = pd.DataFrame(panel['productivity'][:, s], index=pd.Index(panel['years'], name='Year'),
+                         columns=pd.Index(panel['sectors'], name='Sector'))
+
+    # Whole economy over the sectors that have both sides in each year
+    both = ~np.isnan(panel['gva']) & ~np.isnan(panel['productivity'][:, s])
+    gva = np.where(both, panel['gva'], 0.0).sum(axis=1)
+    employment = np.where(both, panel['employment'][:, s], 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frame['Total Economy'] = np.where(employment > 0, ((gva * 1e6) / (employment * 1e3)) / 1e3, np.nan)
+    return frame.dropna(how='all')
+
+
+def panel_table(panel):
+    # Long form of the whole panel: one row per year, sex and sector
+    years, sexes, sectors = np.meshgrid(panel['years'], panel['sexes'], panel['sectors'], indexing='ij')
+    gva = np.broadcast_to(panel['gva'][:, None, :], years.shape)
+    df = pd.DataFrame({
+        'Year': years.ravel(), 'Sexo': sexes.ravel(), 'Sector': sectors.ravel(),
+        'GDP': gva.ravel(), 'Employment': panel['employment'].ravel(),
+        'GDP_per_worker_thousands': panel['productivity'].ravel(),
+    })
+    return df.dropna(subset=['GDP', 'Employment']).reset_index(drop=True)
+
+
+# === Persistence ===
+def save_panel(panel, path):
+    save_store(path, {k: v for k, v in panel.items() if k not in panel_arrays},
+               {name: panel[name] for name in panel_arrays})
+
+
+def load_panel_file(path, mmap=True):
+    return open_store(path, mmap)
+
+
+def load_panel(gva_path, employment_path, sexes=None, cache=None, directory=None):
+    # The panel of a pair of sources is built from their cubes once, then
+    # read back from the cache while neither file changes
+    gva_where = {aggregate_axis: gva_aggregate}
+    employment_where = {'Sexo': list(sexes), 'Unidad': 'Valor absoluto'} if sexes else None
+    if cache is None:
+        cache = cache_enabled
+    sources = {'gva': {'file_path': gva_path, 'where': gva_where, 'cache': cache},
+               'employment': {'file_path': employment_path, 'where': employment_where, 'cache': cache}}
+    if not cache:
+        cubes = load_ine_cubes(sources)
+        return build_panel(cubes['gva'], cubes['employment'], sexes)
+
+    directory = directory or cache_dir
+    key = f"{source_fingerprint(gva_path, directory)}-{source_fingerprint(employment_path, directory)}"
+    path = cache_path(directory, key, selection_key(None, employment_where, None), f'panel{panel_version}.store')
+    if os.path.exists(path):
+        try:
+            return load_panel_file(path)
+        except Exception:
+            # Corrupt or partially written entry: rebuild it
+            pass
+
+    for options in sources.values():
+        options['directory'] = directory
+    cubes = load_ine_cubes(sources)
+    panel = build_panel(cubes['gva'], cubes['employment'], sexes)
+    os.makedirs(directory, exist_ok=True)
+    save_panel(panel, path)
+    return panel
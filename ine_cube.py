@@ -0,0 +1,418 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from array_store import open_store, save_store
+from ine_loader import (
+    cache_dir, cache_enabled, cache_path, clean_ine_rows, load_ine_table, read_ine_text, selection_key,
+    source_fingerprint
+)
+from profiling import profiled
+from sectors import sector_columns
+from validation import checked
+
+# === Annual aggregation cube ===
+# A table is reduced once to dense arrays indexed by
+# (period, sector code, *other dimensions), e.g. (quarter, sector, Sexo, Unidad)
+# for the EPA tables. Annual values are kept as running sums and counts of the
+# non-missing cells, so an annual mean or sum of any combination is a plain
+# array slice rather than a new groupby. Cubes are cached next to the parsed
+# tables, keyed on the source content and the row selection, as memory-mapped
+# array stores (see array_store): a cached cube opens in milliseconds and
+# only the slices a chart reads are paged in.
+#
+# Regional tables (Comunidad Autónoma or province) simply carry the region
+# as one more axis, so all regions are aggregated in the same single pass.
+#
+# With INE_INCREMENTAL=1 each source instead keeps one live cube that is
+# refreshed in place: only the Periodo values that are new or whose rows
+# changed since the last run are decoded and folded in, and only the years
+# they fall in are re-summed.
+#
+# {
+#   'axes': ['Sexo', 'Unidad'],                  # dimensions after the sector
+#   'labels': {'Periodo': [...], 'Year': [...], 'Sector code': [...], 'Sexo': [...], ...},
+#   'period_year': int array, year position of every period,
+#   'quarterly': float array (period, sector, *axes), NaN where missing,
+#   'quarterly_count': int array (period, sector, *axes), rows behind each value,
+#   'annual_sum': float array (year, sector, *axes),
+#   'annual_count': int array (year, sector, *axes),
+# }
+
+# Bump whenever the layout above changes so stale cubes are rebuilt
+cube_version = 2
+cube_extension = f'cube{cube_version}.store'
+incremental = os.environ.get('INE_INCREMENTAL', '0') == '1'
+
+# Independent sources are ingested side by side (load_ine_cubes): on threads
+# by default, since read_csv, the pyarrow number decoding and the Parquet
+# cache reads spend most of their time outside the GIL, or on processes with
+# INE_LOAD_EXECUTOR=process. INE_LOAD_WORKERS caps the pool.
+load_executor = os.environ.get('INE_LOAD_EXECUTOR', 'thread')
+load_workers = int(os.environ.get('INE_LOAD_WORKERS', 0)) or None
+
+# Which library turns the rows of a source into its cube: 'pandas' (the
+# ine_loader tables) or 'polars' (ine_polars: one lazy, multi-threaded
+# query). Both give the same cube, so the cache is shared between them;
+# incremental refreshes always use pandas.
+cube_backend = os.environ.get('INE_BACKEND', 'pandas')
+
+period_column = 'Periodo'
+sector_axis = 'Sector code'
+value_column = 'Total'
+
+# Regional EPA tables add a region column, which becomes one more cube axis;
+# annual_frames() slices every region out of it at once
+region_columns = ['Comunidades y Ciudades Autónomas', 'Provincias']
+national_region = 'Total Nacional'
+
+
+# === Building ===
+def parse_periods(periods):
+    # '2024T3' -> (2024, 3); annual tables ('2024') get quarter 0
+    periods = pd.Series(periods, dtype=str)
+    year = periods.str[:4].astype(int).to_numpy()
+    quarter = pd.to_numeric(periods.str[5:], errors='coerce').fillna(0).astype(int).to_numpy()
+    return year, quarter
+
+
+def period_index(periods):
+    # Periodo labels as a PeriodIndex: quarterly for '2024T3', annual for
+    # '2024'. Built from ordinals (periods since 1970) in one array operation.
+    year, quarter = parse_periods(periods)
+    if (quarter == 0).all():
+        index = pd.PeriodIndex.from_ordinals(year - 1970, freq='Y')
+    elif (quarter == 0).any():
+        raise ValueError("Table mixes annual and quarterly periods")
+    else:
+        index = pd.PeriodIndex.from_ordinals((year - 1970) * 4 + quarter - 1, freq='Q')
+    return index.rename(period_column)
+
+
+def cube_axes(df):
+    # Every categorical dimension other than the period and the sector labels
+    skip = {period_column, sector_axis, *sector_columns}
+    return [c for c in df.columns if c not in skip and isinstance(df[c].dtype, pd.CategoricalDtype)]
+
+
+def _codes(values):
+    # Category positions of a dimension, computed once per unique value
+    values = values.astype('category')
+    return values.cat.codes.to_numpy(), list(values.cat.categories)
+
+
+@profiled('aggregate.cube')
+def build_cube(df):
+    df = df[df[sector_axis].notna()]
+    axes = cube_axes(df)
+
+    period_codes, periods = _codes(df[period_column])
+    period_year, period_quarter = parse_periods(periods)
+    order = np.lexsort((period_quarter, period_year))
+    periods = [periods[i] for i in order]
+    period_codes = np.argsort(order)[period_codes]
+    years, period_year = np.unique(period_year[order], return_inverse=True)
+
+    sector_codes, sectors = _codes(df[sector_axis])
+    labels = {period_column: periods, 'Year': years.tolist(), sector_axis: sectors}
+    positions = [sector_codes]
+    for axis in axes:
+        codes, labels[axis] = _codes(df[axis])
+        positions.append(codes)
+    shape = tuple(len(labels[axis]) for axis in [sector_axis] + axes)
+
+    values = df[value_column].to_numpy(dtype=float)
+    present = ~np.isnan(values)
+
+    # Duplicate rows of a period are averaged, like the groupby they replace
+    quarterly_sum = np.zeros((len(periods),) + shape)
+    quarterly_count = np.zeros((len(periods),) + shape, dtype=np.int64)
+    index = tuple(p[present] for p in [period_codes] + positions)
+    np.add.at(quarterly_sum, index, values[present])
+    np.add.at(quarterly_count, index, 1)
+    with np.errstate(invalid='ignore'):
+        quarterly = quarterly_sum / quarterly_count
+
+    annual_sum = np.zeros((len(years),) + shape)
+    annual_count = np.zeros((len(years),) + shape, dtype=np.int64)
+    index = (period_year[index[0]],) + index[1:]
+    np.add.at(annual_sum, index, values[present])
+    np.add.at(annual_count, index, 1)
+
+    return {'axes': axes, 'labels': labels, 'period_year': period_year, 'quarterly': quarterly,
+            'quarterly_count': quarterly_count, 'annual_sum': annual_sum, 'annual_count': annual_count}
+
+
+# === Slicing ===
+def region_axis(cube):
+    return next((axis for axis in cube['axes'] if axis in region_columns), None)
+
+
+def _position(cube, selection, along=None):
+    # Index of one combination of the other axes; the 'along' axis is kept
+    # whole and ends up last
+    unknown = [k for k in selection if k not in cube['axes']]
+    if unknown:
+        raise ValueError(f"Cube has no dimension {', '.join(unknown)}")
+
+    position = []
+    for axis in cube['axes']:
+        labels = cube['labels'][axis]
+        if axis == along:
+            position.append(slice(None))
+        elif axis in selection:
+            if selection[axis] not in labels:
+                raise KeyError(f"{selection[axis]!r} not in {axis}")
+            position.append(labels.index(selection[axis]))
+        elif len(labels) == 1:
+            position.append(0)
+        else:
+            raise ValueError(f"Select one of {labels} for {axis}")
+    return (slice(None), slice(None)) + tuple(position)
+
+
+def _frame(values, observed, index, sectors):
+    frame = pd.DataFrame(values, index=index, columns=pd.Index(sectors, name=sector_axis))
+    return frame.loc[observed.any(axis=1), observed.any(axis=0)]
+
+
+def _annual_values(sums, counts, how):
+    observed = counts > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = sums / counts if how == 'mean' else np.where(observed, sums, np.nan)
+    return values, observed
+
+
+def annual_frame(cube, how='mean', **selection):
+    # Year x sector table of annual means (or sums) for one combination of
+    # the other axes; years and sectors without any data are left out
+    position = _position(cube, selection)
+    values, observed = _annual_values(cube['annual_sum'][position], cube['annual_count'][position], how)
+    return _frame(values, observed, pd.Index(cube['labels']['Year'], name='Year'),
+                  cube['labels'][sector_axis])
+
+
+def annual_frames(cube, along, how='mean', **selection):
+    # annual_frame() of every label of one axis (e.g. every region), from a
+    # single slice of the cube: {label: Year x sector frame}
+    if along not in cube['axes']:
+        raise ValueError(f"Cube has no dimension {along}")
+    position = _position(cube, {k: v for k, v in selection.items() if k != along}, along)
+    sums = np.moveaxis(cube['annual_sum'][position], -1, 0)
+    counts = np.moveaxis(cube['annual_count'][position], -1, 0)
+    values, observed = _annual_values(sums, counts, how)
+    index = pd.Index(cube['labels']['Year'], name='Year')
+    return {label: _frame(values[i], observed[i], index, cube['labels'][sector_axis])
+            for i, label in enumerate(cube['labels'][along]) if observed[i].any()}
+
+
+def quarterly_frame(cube, **selection):
+    # Period x sector table of quarterly values on a PeriodIndex, for one
+    # combination of the other axes
+    values = cube['quarterly'][_position(cube, selection)]
+    return _frame(values, ~np.isnan(values), period_index(cube['labels'][period_column]),
+                  cube['labels'][sector_axis])
+
+
+# === Incremental updates ===
+def _merged_labels(old, new):
+    known = set(old)
+    return old + [label for label in new if label not in known]
+
+
+def _expand(values, positions, shape, fill):
+    # Places an array on a larger set of labels; 'positions' gives the new
+    # position of every old label along each axis
+    expanded = np.full(shape, fill, dtype=values.dtype)
+    expanded[np.ix_(*positions)] = values
+    return expanded
+
+
+@profiled('aggregate.update')
+def update_cube(cube, delta, removed=()):
+    # Periods present in 'delta' replace the stored ones wholesale and
+    # 'removed' periods are emptied. Annual sums and counts are rebuilt from
+    # the quarters of the affected years only.
+    if delta['axes'] != cube['axes']:
+        raise ValueError(f"Cannot merge a cube over {delta['axes']} into one over {cube['axes']}")
+
+    periods = _merged_labels(cube['labels'][period_column], delta['labels'][period_column])
+    period_year, period_quarter = parse_periods(periods)
+    order = np.lexsort((period_quarter, period_year))
+    periods = [periods[i] for i in order]
+    years, period_year = np.unique(period_year[order], return_inverse=True)
+
+    labels = {period_column: periods, 'Year': years.tolist()}
+    for axis in [sector_axis] + cube['axes']:
+        labels[axis] = _merged_labels(cube['labels'][axis], delta['labels'][axis])
+    shape = (len(periods),) + tuple(len(labels[axis]) for axis in [sector_axis] + cube['axes'])
+
+    def positions(source):
+        return [np.array([labels[axis].index(label) for label in source['labels'][axis]], dtype=int)
+                for axis in [period_column, sector_axis] + cube['axes']]
+
+    old, new = positions(cube), positions(delta)
+    quarterly_sum = _expand(np.nan_to_num(cube['quarterly']) * cube['quarterly_count'], old, shape, 0.0)
+    quarterly_count = _expand(cube['quarterly_count'], old, shape, 0)
+
+    replaced = np.concatenate([new[0], [periods.index(p) for p in removed if p in periods]]).astype(int)
+    quarterly_sum[replaced] = 0.0
+    quarterly_count[replaced] = 0
+    quarterly_sum[np.ix_(*new)] = np.nan_to_num(delta['quarterly']) * delta['quarterly_count']
+    quarterly_count[np.ix_(*new)] = delta['quarterly_count']
+
+    year_positions = [np.array([labels['Year'].index(y) for y in cube['labels']['Year']], dtype=int)] + old[1:]
+    annual_sum = _expand(cube['annual_sum'], year_positions, (len(years),) + shape[1:], 0.0)
+    annual_count = _expand(cube['annual_count'], year_positions, (len(years),) + shape[1:], 0)
+    for year in np.unique(period_year[replaced]):
+        in_year = period_year == year
+        annual_sum[year] = quarterly_sum[in_year].sum(axis=0)
+        annual_count[year] = quarterly_count[in_year].sum(axis=0)
+
+    with np.errstate(invalid='ignore'):
+        quarterly = quarterly_sum / quarterly_count
+    return {'axes': cube['axes'], 'labels': labels, 'period_year': period_year, 'quarterly': quarterly,
+            'quarterly_count': quarterly_count, 'annual_sum': annual_sum, 'annual_count': annual_count}
+
+
+def period_digests(raw):
+    # One order-independent fingerprint per Periodo over the text of its rows
+    hashes = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    codes, periods = pd.factorize(raw[period_column])
+    digests = np.zeros(len(periods), dtype=np.uint64)
+    np.add.at(digests, codes, hashes)
+    return dict(zip(periods, digests))
+
+
+def refresh_ine_cube(file_path, where=None, prefix=None, directory=None):
+    # Keeps one live cube per source path and selection. When the file
+    # changed, its rows are fingerprinted per Periodo and only new or revised
+    # periods are decoded and folded in.
+    directory = directory or cache_dir
+    sha1 = source_fingerprint(file_path, directory)
+    key = json.dumps([os.path.abspath(file_path), selection_key(None, where, prefix)], sort_keys=True)
+    path = os.path.join(directory, f"live-{hashlib.sha1(key.encode()).hexdigest()[:16]}.{cube_extension}")
+
+    cube = None
+    if os.path.exists(path):
+        try:
+            cube = load_cube(path)
+        except Exception:
+            # Corrupt or partially written entry: rebuild it
+            pass
+    if cube is not None and cube.get('source') == sha1:
+        return cube
+
+    raw = read_ine_text(file_path, where=where, prefix=prefix)
+    digests = period_digests(raw)
+    if cube is None:
+        changed, removed = list(digests), []
+        cube = build_cube(clean_ine_rows(raw))
+    else:
+        known = dict(zip(cube['labels'][period_column], cube['period_digest']))
+        changed = [p for p, digest in digests.items() if known.get(p) != digest]
+        removed = [p for p in known if p not in digests]
+        if changed or removed:
+            delta = clean_ine_rows(raw[raw[period_column].isin(changed)].reset_index(drop=True))
+            cube = update_cube(cube, build_cube(delta), removed)
+    print(f"[ingest] {os.path.basename(file_path)}: {len(changed)} new or revised periods, "
+          f"{len(removed)} removed")
+
+    cube['period_digest'] = np.array([digests.get(p, 0) for p in cube['labels'][period_column]],
+                                     dtype=np.uint64)
+    cube['source'] = sha1
+    os.makedirs(directory, exist_ok=True)
+    save_cube(cube, path)
+    return cube
+
+
+# === Persistence ===
+cube_arrays = ('period_year', 'quarterly', 'quarterly_count', 'annual_sum', 'annual_count', 'period_digest')
+
+
+def save_cube(cube, path):
+    save_store(path, {k: v for k, v in cube.items() if k not in cube_arrays},
+               {name: cube[name] for name in cube_arrays if name in cube})
+
+
+def load_cube(path, mmap=True):
+    return open_store(path, mmap)
+
+
+def _pandas_cube(file_path, where=None, prefix=None, cache=None, directory=None):
+    return build_cube(load_ine_table(file_path, where=where, prefix=prefix, cache=cache, directory=directory))
+
+
+def _polars_cube(file_path, where=None, prefix=None, cache=None, directory=None):
+    from ine_polars import build_cube_polars, scan_ine_tsv
+    return build_cube_polars(scan_ine_tsv(file_path, where=where, prefix=prefix))
+
+
+cube_backends = {'pandas': _pandas_cube, 'polars': _polars_cube}
+
+
+def build_source_cube(file_path, where=None, prefix=None, cache=None, directory=None, backend=None):
+    # The cube of one source and selection, built from its rows by the given
+    # backend (default INE_BACKEND)
+    backend = backend or cube_backend
+    if backend not in cube_backends:
+        raise ValueError(f"Unknown cube backend: {backend} (choose from {', '.join(cube_backends)})")
+    return cube_backends[backend](file_path, where=where, prefix=prefix, cache=cache, directory=directory)
+
+
+def _cached_cube(file_path, where=None, prefix=None, cache=None, directory=None, backend=None):
+    if incremental and cache is not False:
+        return refresh_ine_cube(file_path, where=where, prefix=prefix, directory=directory)
+    if cache is None:
+        cache = cache_enabled
+    if not cache:
+        return build_source_cube(file_path, where=where, prefix=prefix, cache=False, backend=backend)
+
+    directory = directory or cache_dir
+    sha1 = source_fingerprint(file_path, directory)
+    path = cache_path(directory, sha1, selection_key(None, where, prefix), cube_extension)
+    if os.path.exists(path):
+        try:
+            return load_cube(path)
+        except Exception:
+            # Corrupt or partially written entry: rebuild it
+            pass
+
+    cube = build_source_cube(file_path, where=where, prefix=prefix, directory=directory, backend=backend)
+    os.makedirs(directory, exist_ok=True)
+    save_cube(cube, path)
+    return cube
+
+
+def load_ine_cube(file_path, where=None, prefix=None, cache=None, directory=None, backend=None):
+    # Same selection arguments as load_ine_table; the cube of every distinct
+    # source and selection is built once and read back from the cache after.
+    # Every cube handed out is validated (see validation) unless
+    # INE_VALIDATE=0.
+    cube = _cached_cube(file_path, where=where, prefix=prefix, cache=cache, directory=directory, backend=backend)
+    return checked(cube, os.path.basename(file_path))
+
+
+def _load_source(options):
+    return load_ine_cube(**options)
+
+
+def load_ine_cubes(sources, workers=None, executor=None):
+    # {name: {'file_path': ..., 'where': ..., ...}} -> {name: cube}; each
+    # entry takes the arguments of load_ine_cube. Wall time tends to the
+    # slowest source rather than the sum of all of them.
+    workers = min(workers or load_workers or os.cpu_count() or 1, len(sources))
+    if workers <= 1:
+        return {name: load_ine_cube(**options) for name, options in sources.items()}
+
+    executor = executor or load_executor
+    if executor not in ('thread', 'process'):
+        raise ValueError(f"Unknown loader executor: {executor}")
+    pool = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+    with pool(max_workers=workers) as ex:
+        futures = {name: ex.submit(_load_source, options) for name, options in sources.items()}
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,330 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+from profiling import stage
+from sectors import sector_code, sector_columns, sector_dictionary
+
+# === Cache configuration ===
+# Parsed tables are stored next to each other in a local cache directory, one
+# columnar file per distinct source content. Set INE_CACHE_DIR to move it, or
+# INE_CACHE=0 to always parse the TSV from scratch.
+cache_dir = os.environ.get('INE_CACHE_DIR', '.ine_cache')
+cache_enabled = os.environ.get('INE_CACHE', '1') != '0'
+
+# Bump whenever the cleanup below changes so stale cache entries are ignored
+cache_version = 3
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    cache_format = 'parquet'
+    # What reading a corrupt or partially written entry raises
+    cache_read_errors = (OSError, pa.ArrowInvalid)
+except ImportError:
+    pa = None
+    cache_format = 'pickle'
+    cache_read_errors = (OSError, EOFError, pickle.UnpicklingError)
+
+index_file = 'index.json'
+hash_chunk_size = 1 << 20
+
+# Sources may be loaded from several threads at once (see
+# ine_cube.load_ine_cubes): the index is updated under a lock and every
+# cache write goes through its own temporary file
+_index_lock = threading.Lock()
+
+
+def _tmp_path(path):
+    return f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+# Rows per chunk when streaming a filtered read
+chunk_rows = int(os.environ.get('INE_CHUNK_ROWS', 250_000))
+
+
+# === Source fingerprint ===
+def file_hash(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(hash_chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_index(directory):
+    try:
+        with open(os.path.join(directory, index_file)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(directory, index):
+    tmp_path = _tmp_path(os.path.join(directory, index_file))
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(directory, index_file))
+
+
+def source_fingerprint(file_path, directory=None):
+    # Size and mtime are checked first; the content hash is only recomputed
+    # when either of them changed since the last time the file was seen.
+    directory = directory or cache_dir
+    stat = os.stat(file_path)
+    key = os.path.abspath(file_path)
+    with _index_lock:
+        entry = _read_index(directory).get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['sha1']
+
+    sha1 = file_hash(file_path)
+    os.makedirs(directory, exist_ok=True)
+    with _index_lock:
+        index = _read_index(directory)
+        index[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': sha1}
+        _write_index(directory, index)
+    return sha1
+
+
+def cache_path(directory, sha1, selection=None, extension=None):
+    # Filtered reads get their own entry, keyed on the selection as well
+    extension = extension or ('parquet' if cache_format == 'parquet' else 'pkl')
+    suffix = ''
+    if selection is not None:
+        suffix = '-' + hashlib.sha1(json.dumps(selection, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(directory, f"{sha1}-v{cache_version}{suffix}.{extension}")
+
+
+# === Spanish-formatted numbers ===
+# INE writes '1.234,5' (thousands dot, decimal comma) and marks unavailable
+# cells with '..' or leaves them blank.
+ine_missing_markers = ['..', '']
+ine_number_format = dict(thousands='.', decimal=',',
+                         na_values=ine_missing_markers, keep_default_na=False)
+
+
+def _decode_with_arrow(values):
+    # Arrow kernels work on the packed UTF-8 buffer: no Python string objects
+    arr = pa.array(values, type=pa.string(), from_pandas=True)
+    arr = pc.utf8_trim_whitespace(arr)
+    arr = pc.replace_substring(arr, '.', '')
+    arr = pc.replace_substring(arr, ',', '.')
+    arr = pc.if_else(pc.equal(arr, ''), pa.scalar(None, pa.string()), arr)
+    try:
+        decoded = pc.cast(arr, pa.float64())
+    except pa.ArrowInvalid as exc:
+        raise ValueError(f"Unparseable INE numbers in '{values.name}': {exc}") from None
+    return pd.Series(decoded.to_numpy(zero_copy_only=False), index=values.index, name=values.name)
+
+
+def _decode_with_csv_parser(values):
+    # Same single C pass read_csv does at load time, fed from memory
+    text = '\n'.join(values.astype(object).where(values.notna(), '').astype(str))
+    decoded = pd.read_csv(io.StringIO(text), sep='\t', header=None, names=[values.name],
+                          skip_blank_lines=False, **ine_number_format).iloc[:, 0]
+    if not pd.api.types.is_numeric_dtype(decoded):
+        text = decoded.astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        bad = pd.to_numeric(text, errors='coerce').isna() & decoded.notna()
+        examples = ', '.join(repr(v) for v in decoded[bad].unique()[:5])
+        raise ValueError(f"Unparseable INE numbers in '{values.name}': {examples}")
+    decoded.index = values.index
+    return decoded.astype(float)
+
+
+def decode_ine_numbers(values):
+    if pd.api.types.is_numeric_dtype(values) or values.empty:
+        return values.astype(float)
+    if pa is not None:
+        return _decode_with_arrow(values)
+    return _decode_with_csv_parser(values)
+
+
+# === Dimension encoding ===
+def sector_code_order(label_codes):
+    # Dictionary order first, so pivots come out A, B, C, ... as in the charts
+    categories = [c for c in sector_dictionary(label_codes) if c in label_codes]
+    return categories + [c for c in dict.fromkeys(label_codes) if c not in categories]
+
+
+def encode_sector_codes(labels):
+    # Codes are worked out once per distinct label, not once per row
+    label_codes = [sector_code(label) for label in labels.cat.categories]
+    categories = sector_code_order(label_codes)
+
+    position = {code: i for i, code in enumerate(categories)}
+    lookup = np.array([position[c] for c in label_codes] + [-1], dtype=np.int16)
+    return pd.Categorical.from_codes(lookup[labels.cat.codes], categories=categories)
+
+
+def encode_dimensions(df):
+    # Text dimensions (sex, unit, sector, aggregate, period) are stored as
+    # integer-coded categoricals, so filters and groupbys compare small ints
+    # instead of hashing the long INE labels on every row.
+    for column in df.columns:
+        if column != 'Total' and not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype('category')
+
+    for column in sector_columns:
+        if column in df.columns:
+            df['Sector code'] = encode_sector_codes(df[column])
+            break
+    return df
+
+
+# === Parsing and cleanup ===
+def parse_ine_tsv(file_path):
+    # The C parser decodes the Spanish number format while reading, so the
+    # 'Total' column never exists as a column of Python strings.
+    with stage('load.read_csv') as s:
+        df = pd.read_csv(file_path, sep='\t', encoding='latin1', **ine_number_format)
+        s.count(len(df))
+    return clean_ine_rows(df)
+
+
+def clean_ine_rows(df):
+    if 'Total' in df.columns:
+        with stage('clean.decode') as s:
+            df['Total'] = decode_ine_numbers(df['Total'])
+            s.count(len(df))
+    with stage('clean.encode') as s:
+        df = encode_dimensions(df)
+        s.count(len(df))
+    return df
+
+
+# === Predicate pushdown ===
+# 'where' maps a column to a value (or list of values) it must equal, and
+# 'prefix' maps a column to a prefix it must start with, e.g.
+# where={'Sexo': 'Mujeres', 'Unidad': 'Porcentaje'}, prefix={'Periodo': '2024'}.
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def _row_mask(df, where=None, prefix=None):
+    mask = np.ones(len(df), dtype=bool)
+    for column, value in (where or {}).items():
+        mask &= df[column].isin(_as_list(value)).to_numpy()
+    for column, value in (prefix or {}).items():
+        mask &= df[column].astype(str).str.startswith(str(value)).fillna(False).to_numpy(dtype=bool)
+    return mask
+
+
+def _selected_columns(columns, where=None, prefix=None):
+    # The requested columns plus the ones the row selection reads
+    if columns is None:
+        return None
+    return list(dict.fromkeys(list(columns) + list(where or {}) + list(prefix or {})))
+
+
+def _read_matching_rows(file_path, columns=None, where=None, prefix=None, chunksize=None, dtype=None):
+    usecols = _selected_columns(columns, where, prefix)
+
+    with stage('load.read_csv') as s:
+        reader = pd.read_csv(file_path, sep='\t', encoding='latin1', usecols=usecols,
+                             dtype=dtype, na_values=ine_missing_markers,
+                             keep_default_na=False, chunksize=chunksize or chunk_rows)
+        parts = [chunk[_row_mask(chunk, where, prefix)] for chunk in reader]
+        df = pd.concat(parts, ignore_index=True)
+        s.count(len(df))
+    return df
+
+
+def read_ine_tsv_filtered(file_path, columns=None, where=None, prefix=None, chunksize=None):
+    # Streams the TSV in chunks and keeps only matching rows, so peak memory
+    # follows the selection rather than the file. 'Total' stays text until
+    # the matching rows are known, and only those rows get decoded.
+    df = _read_matching_rows(file_path, columns, where, prefix, chunksize, dtype={'Total': str})
+    return clean_ine_rows(df)
+
+
+def read_ine_text(file_path, where=None, prefix=None, chunksize=None):
+    # Matching rows with every column left as text, for callers that compare
+    # rows before paying for the decode (see clean_ine_rows)
+    return _read_matching_rows(file_path, None, where, prefix, chunksize, dtype=str)
+
+
+def selection_key(columns, where, prefix):
+    if columns is None and not where and not prefix:
+        return None
+    return {'columns': columns, 'where': {k: _as_list(v) for k, v in (where or {}).items()},
+            'prefix': prefix or {}}
+
+
+def _read_cache(path, columns=None, where=None, prefix=None):
+    # Same columns, in the same order, as read_ine_tsv_filtered gives for the
+    # selection: the selection's own columns, and 'Sector code' with a sector
+    # column
+    wanted = _selected_columns(columns, where, prefix)
+    if wanted is not None and any(column in wanted for column in sector_columns):
+        wanted.append('Sector code')
+    if cache_format == 'parquet':
+        if wanted is not None:
+            wanted = [column for column in pq.read_schema(path).names if column in wanted]
+        filters = [(column, 'in', _as_list(value)) for column, value in (where or {}).items()]
+        df = pd.read_parquet(path, columns=wanted, filters=filters or None)
+    else:
+        df = pd.read_pickle(path)
+        if wanted is not None:
+            df = df[[column for column in df.columns if column in wanted]]
+    if prefix or (where and cache_format != 'parquet'):
+        df = df[_row_mask(df, where, prefix)].reset_index(drop=True)
+    if where or prefix:
+        for column in df.select_dtypes('category'):
+            df[column] = df[column].cat.remove_unused_categories()
+    return df
+
+
+def _write_cache(df, path):
+    tmp_path = _tmp_path(path)
+    if cache_format == 'parquet':
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# === Public loader ===
+def load_ine_table(file_path, columns=None, where=None, prefix=None, cache=None, directory=None):
+    # Without a selection the whole cleaned table is parsed once and cached.
+    # With one, a cached full table is read back with the filters pushed into
+    # the Parquet reader; otherwise the TSV is streamed chunk by chunk and
+    # only the matching rows are kept (and cached under their own key).
+    selection = selection_key(columns, where, prefix)
+    if cache is None:
+        cache = cache_enabled
+    if not cache:
+        if selection is None:
+            return parse_ine_tsv(file_path)
+        return read_ine_tsv_filtered(file_path, columns, where, prefix)
+
+    directory = directory or cache_dir
+    sha1 = source_fingerprint(file_path, directory)
+    candidates = [(cache_path(directory, sha1), (columns, where, prefix))]
+    if selection is not None:
+        candidates.insert(0, (cache_path(directory, sha1, selection), (None, None, None)))
+
+    for path, pushdown in candidates:
+        if os.path.exists(path):
+            try:
+                with stage('load.cache') as s:
+                    df = _read_cache(path, *pushdown)
+                    s.count(len(df))
+                return df
+            except cache_read_errors:
+                # Corrupt or partially written entry: fall through and rebuild it
+                pass
+
+    if selection is None:
+        df = parse_ine_tsv(file_path)
+    else:
+        df = read_ine_tsv_filtered(file_path, columns, where, prefix)
+    os.makedirs(directory, exist_ok=True)
+    _write_cache(df, candidates[0][0])
+    return df
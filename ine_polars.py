@@ -0,0 +1,122 @@
+import numpy as np
+
+from ine_cube import parse_periods, period_column, sector_axis
+from ine_loader import sector_code_order
+from profiling import stage
+from sectors import sector_code, sector_columns
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# === Polars backend ===
+# The row-level half of turning an INE table into a cube (read the TSV,
+# decode the Spanish numbers, apply the row selection, group the rows by
+# period, sector and every other dimension) as one lazy Polars query, run
+# multi-threaded on Arrow memory. The grouped cells, a few thousand rows, are
+# then laid out in the same dense arrays and label order build_cube gives,
+# so slices, charts and the cube cache are the same for both backends.
+# Selected with INE_BACKEND=polars (see ine_cube.cube_backends).
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def scan_ine_tsv(file_path, where=None, prefix=None):
+    # Lazy frame of the selected rows, 'Total' decoded to Float64 and every
+    # dimension left as text. Polars only scans UTF-8, so the latin-1 file is
+    # read eagerly and everything after that is lazy.
+    if pl is None:
+        raise ImportError("The polars backend needs polars (pip install polars)")
+    with stage('load.read_csv') as s:
+        df = pl.read_csv(file_path, separator='\t', encoding='latin1', infer_schema=False)
+        s.count(len(df))
+
+    frame = df.lazy()
+    for column, value in (where or {}).items():
+        frame = frame.filter(pl.col(column).is_in([str(v) for v in _as_list(value)]))
+    for column, value in (prefix or {}).items():
+        frame = frame.filter(pl.col(column).str.starts_with(str(value)))
+    if 'Total' in df.columns:
+        # Without its thousands dots, the '..' marker is empty like a blank cell
+        text = (pl.col('Total').str.strip_chars().str.replace_all('.', '', literal=True)
+                .str.replace(',', '.', literal=True))
+        frame = frame.with_columns(pl.when(text == '').then(None).otherwise(text).cast(pl.Float64).alias('Total'))
+    return frame
+
+
+def _labels(series):
+    # Sorted distinct labels, as pandas orders categories
+    return series.drop_nulls().unique().sort().to_list()
+
+
+def _positions(series, labels):
+    # Position of every value in 'labels', without leaving Arrow memory
+    return series.cast(pl.Enum(labels)).to_physical().to_numpy().astype(np.int64)
+
+
+def build_cube_polars(frame):
+    # Same cube as ine_cube.build_cube, from a scan_ine_tsv frame
+    columns = frame.collect_schema().names()
+    sector = next((column for column in sector_columns if column in columns), None)
+    if sector is None:
+        raise ValueError(f"No sector column among {columns}")
+    axes = [c for c in columns if c not in (period_column, sector, 'Total', *sector_columns)]
+    keys = [period_column, sector] + axes
+
+    with stage('aggregate.cube') as s:
+        try:
+            cells = (frame.group_by(keys)
+                     .agg(pl.col('Total').sum().alias('sum'), pl.col('Total').count().alias('count'))
+                     .collect())
+        except pl.exceptions.InvalidOperationError as exc:
+            raise ValueError(f"Unparseable INE numbers in 'Total': {exc}") from None
+        s.count(len(cells))
+
+    # Like the pandas categories, the labels of text dimensions come from
+    # every selected row, rows without a sector included; only those rows
+    # are then left out of the arrays
+    with_sector = cells.filter(pl.col(sector).is_not_null())
+    periods = _labels(cells[period_column])
+    numeric = all(period.isdigit() for period in periods)
+    if numeric:
+        # read_csv types all-digit periods as numbers, which are not categories
+        periods = _labels(with_sector[period_column])
+    period_year, period_quarter = parse_periods(periods)
+    order = np.lexsort((period_quarter, period_year))
+    periods = [periods[i] for i in order]
+    years, period_year = np.unique(period_year[order], return_inverse=True)
+
+    # Sector codes are worked out per distinct label, then cells whose labels
+    # share a code are added together below
+    sector_labels = _labels(with_sector[sector])
+    label_codes = [sector_code(label) for label in sector_labels]
+    sectors = sector_code_order(label_codes)
+    code_position = np.array([sectors.index(code) for code in label_codes], dtype=np.int64)
+
+    labels = {period_column: [int(p) for p in periods] if numeric else periods,
+              'Year': years.tolist(), sector_axis: sectors}
+    index = [_positions(with_sector[period_column], periods),
+             code_position[_positions(with_sector[sector], sector_labels)]]
+    for axis in axes:
+        labels[axis] = _labels(cells[axis])
+        index.append(_positions(with_sector[axis], labels[axis]))
+    shape = tuple(len(labels[axis]) for axis in [sector_axis] + axes)
+
+    index = tuple(index)
+    quarterly_sum = np.zeros((len(periods),) + shape)
+    quarterly_count = np.zeros((len(periods),) + shape, dtype=np.int64)
+    np.add.at(quarterly_sum, index, with_sector['sum'].to_numpy())
+    np.add.at(quarterly_count, index, with_sector['count'].to_numpy())
+    with np.errstate(invalid='ignore'):
+        quarterly = quarterly_sum / quarterly_count
+
+    annual_sum = np.zeros((len(years),) + shape)
+    annual_count = np.zeros((len(years),) + shape, dtype=np.int64)
+    np.add.at(annual_sum, period_year, quarterly_sum)
+    np.add.at(annual_count, period_year, quarterly_count)
+
+    return {'axes': axes, 'labels': labels, 'period_year': period_year, 'quarterly': quarterly,
+            'quarterly_count': quarterly_count, 'annual_sum': annual_sum, 'annual_count': annual_count}
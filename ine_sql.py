@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import re
+
+import pandas as pd
+
+from gva_employment_panel import gva_aggregate
+from ine_loader import cache_dir, cache_enabled, cache_format, cache_path, source_fingerprint
+from profiling import stage
+from sectors import a10_groups, cnae_to_a10, group_codes, sector_columns, sector_dictionary, total_code
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# === SQL over the INE tables (optional, needs duckdb) ===
+# An in-process DuckDB connection with every source registered as a view of
+# the cleaned table: the same columns load_ine_table gives ('Total' as a
+# number, 'Sector code' next to the INE sector label) plus 'Year' and
+# 'Quarter'. A view reads the cached Parquet of the table when there is one
+# and the raw TSV otherwise (latin-1, '1.234,5' numbers, '..' gaps), so
+# DuckDB pushes filters into the scan and runs it on every core. Nothing is
+# materialised until a query runs.
+#
+#   con = connect({'employment': 'epa.tsv', 'gva': 'cne.tsv'})
+#   query(con, 'SELECT Year, avg(Total) FROM employment WHERE Sexo = ? GROUP BY ALL', 'Mujeres')
+#
+# annual_sector_means, a10_gva_sums and gva_per_worker are the SQL forms of
+# the annual cube slices and the GVA / employment panel. From the shell:
+#
+#   python ine_sql.py spec.json "SELECT ..."
+view_name_pattern = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _tsv_columns(file_path):
+    with open(file_path, encoding='latin1') as f:
+        return f.readline().rstrip('\r\n').split('\t')
+
+
+def _tsv_relation(file_path):
+    # The raw file, cleaned the way ine_loader cleans it
+    columns = _tsv_columns(file_path)
+    selected = []
+    for column in columns:
+        if column == 'Total':
+            # Without its thousands dots, the '..' marker is empty like a blank cell
+            selected.append("CAST(nullif(replace(replace(trim(\"Total\"), '.', ''), ',', '.'), '') AS DOUBLE) AS \"Total\"")
+        else:
+            selected.append(_quote(column))
+    sector = next((column for column in sector_columns if column in columns), None)
+    if sector is not None:
+        label = f"trim({_quote(sector)})"
+        selected.append(f"coalesce(nullif(regexp_extract({label}, '^([A-Z]+)\\s', 1), ''), {label}) AS \"Sector code\"")
+    return (f"SELECT {', '.join(selected)} FROM read_csv({_literal(os.path.abspath(file_path))}, "
+            f"delim='\\t', header=true, encoding='latin-1', all_varchar=true)")
+
+
+def _source_relation(file_path, cache=None, directory=None):
+    if cache is None:
+        cache = cache_enabled
+    if cache and cache_format == 'parquet':
+        directory = directory or cache_dir
+        path = cache_path(directory, source_fingerprint(file_path, directory))
+        if os.path.exists(path):
+            return f"SELECT * FROM read_parquet({_literal(os.path.abspath(path))})"
+    return _tsv_relation(file_path)
+
+
+def register_source(con, name, file_path, cache=None, directory=None):
+    if not view_name_pattern.match(name):
+        raise ValueError(f"Not a usable view name: {name!r}")
+    period = 'CAST("Periodo" AS VARCHAR)'
+    con.execute(f"CREATE OR REPLACE VIEW {_quote(name)} AS "
+                f"SELECT *, CAST(left({period}, 4) AS INTEGER) AS \"Year\", "
+                f"TRY_CAST(substr({period}, 6) AS INTEGER) AS \"Quarter\" "
+                f"FROM ({_source_relation(file_path, cache, directory)})")
+
+
+def connect(sources=None, threads=None, cache=None, directory=None):
+    # {view name: TSV path} -> DuckDB connection with the views and the
+    # CNAE section -> A10 group table ('a10_sections')
+    if duckdb is None:
+        raise ImportError("The SQL layer needs duckdb (pip install duckdb)")
+    con = duckdb.connect()
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    con.execute("CREATE TABLE a10_sections (code VARCHAR, a10 VARCHAR)")
+    con.executemany("INSERT INTO a10_sections VALUES (?, ?)", list(cnae_to_a10.items()))
+    for name, file_path in (sources or {}).items():
+        register_source(con, name, file_path, cache, directory)
+    return con
+
+
+def query(con, sql, *params):
+    with stage('load.sql') as s:
+        df = con.execute(sql, list(params)).df()
+        s.count(len(df))
+    return df
+
+
+def _pivot(df, column_name, order):
+    # Long (Year, sector, value) rows as a Year x sector frame, sectors in
+    # 'order' first
+    frame = df.pivot(index='Year', columns='sector', values='value').sort_index()
+    columns = [code for code in order if code in frame.columns]
+    columns += sorted(code for code in frame.columns if code not in columns)
+    frame = frame[columns]
+    frame.index = frame.index.astype(int)
+    frame.columns = pd.Index(frame.columns, name=column_name)
+    return frame
+
+
+def _conditions(where):
+    # 'where' as in load_ine_table: {column: value or list of values}
+    clauses, params = [], []
+    for column, value in (where or {}).items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+        params += values
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+
+# === The shared aggregations ===
+def annual_sector_means(con, source, sex, unit='Valor absoluto', where=None):
+    # Same table as ine_cube.annual_frame(cube, Sexo=sex, Unidad=unit, **where);
+    # regional tables need their region in 'where'
+    conditions, params = _conditions(where)
+    df = query(con, f"""
+        SELECT "Year", "Sector code" AS sector, avg("Total") AS value
+        FROM {_quote(source)}
+        WHERE "Sexo" = ? AND "Unidad" = ? AND "Total" IS NOT NULL AND "Sector code" IS NOT NULL{conditions}
+        GROUP BY ALL""", sex, unit, *params)
+    return _pivot(df, 'Sector code', list(sector_dictionary(df['sector'].unique())) + [total_code])
+
+
+def a10_gva_sums(con, source, aggregate=gva_aggregate):
+    # Same table as gva_employment_panel.gdp_by_sector, without the empty
+    # groups
+    df = query(con, f"""
+        SELECT "Year", "Sector code" AS sector, sum("Total") AS value
+        FROM {_quote(source)}
+        WHERE "Agregados macroeconómicos" = ? AND "Total" IS NOT NULL
+            AND "Sector code" IN (SELECT DISTINCT a10 FROM a10_sections)
+        GROUP BY ALL""", aggregate)
+    return _pivot(df, 'Sector', list(a10_groups))
+
+
+def gva_per_worker(con, gva_source, employment_source, sex, aggregate=gva_aggregate):
+    # € thousands of GVA per worker by year and A10 group, as in the
+    # productivity panel: each CNAE section's annual mean employment is added
+    # up into its group
+    df = query(con, f"""
+        WITH gva AS (
+            SELECT "Year", "Sector code" AS sector, sum("Total") AS gva
+            FROM {_quote(gva_source)}
+            WHERE "Agregados macroeconómicos" = ? AND "Total" IS NOT NULL
+            GROUP BY ALL
+        ), sections AS (
+            SELECT "Year", "Sector code" AS code, avg("Total") AS employment
+            FROM {_quote(employment_source)}
+            WHERE "Sexo" = ? AND "Unidad" = 'Valor absoluto' AND "Total" IS NOT NULL
+            GROUP BY ALL
+        ), employment AS (
+            SELECT "Year", a10 AS sector, sum(employment) AS employment
+            FROM sections JOIN a10_sections USING (code)
+            GROUP BY ALL
+        )
+        SELECT "Year", sector, (gva * 1e6) / (employment * 1e3) / 1e3 AS value
+        FROM gva JOIN employment USING ("Year", sector)""", aggregate, sex)
+    return _pivot(df, 'Sector', group_codes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a SQL query over the sources of a spec file.')
+    parser.add_argument('spec', help='JSON spec with the same sources as render_matrix; each one becomes a view')
+    parser.add_argument('sql', help='query, e.g. "SELECT Year, sum(Total) FROM gva GROUP BY ALL ORDER BY Year"')
+    parser.add_argument('--threads', type=int, help='DuckDB threads (default: one per core)')
+    parser.add_argument('--output', help='CSV file for the result (default: print it)')
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        sources = json.load(f).get('sources', {})
+    result = query(connect(sources, threads=args.threads), args.sql)
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"Wrote {len(result)} rows to {args.output}")
+    else:
+        print(result.to_string(index=False))
@@ -0,0 +1,71 @@
+import numpy as np
+
+# === Label layout for stacked area charts ===
+# Works on the stacked matrix as a plain array: one row per x position, one
+# column per series, bottom series first. One cumulative sum gives every
+# label position, and overlaps are resolved with array operations instead of
+# a pass that only looks at the previous label.
+
+luma_weights = np.array([0.299, 0.587, 0.114])
+
+
+def brightness(colors):
+    import matplotlib.colors as mcolors
+    return mcolors.to_rgba_array(colors)[:, :3] @ luma_weights
+
+
+def contrast_colors(colors, light='white', dark='black', threshold=0.5):
+    # Light text on dark fills, dark text on light ones
+    return np.where(brightness(colors) < threshold, light, dark)
+
+
+def stack_centres(values):
+    # Vertical centre of every band, for every row at once
+    values = np.asarray(values, dtype=float)
+    return np.cumsum(values, axis=1) - values / 2
+
+
+def spread_labels(y, min_sep, movable=None):
+    # Moves labels up until each one sits at least min_sep above the label
+    # before it, taking labels in stacking order. The recurrence
+    # y[i] = max(y[i], y[i-1] + min_sep) becomes a running maximum of
+    # y[i] - i * min_sep; labels that may not move restart it.
+    y = np.asarray(y, dtype=float)
+    if y.size == 0:
+        return y
+    steps = min_sep * np.arange(y.size)
+    shifted = y - steps
+    if movable is None:
+        return np.maximum.accumulate(shifted) + steps
+
+    # Lift every segment that starts at a fixed label above the previous one
+    segment = np.cumsum(~np.asarray(movable, dtype=bool))
+    lift = segment * (np.ptp(shifted) + 1.0)
+    return np.maximum.accumulate(shifted + lift) - lift + steps
+
+
+def stack_label_layout(values, min_sep=None, mid_index=None):
+    # Start, middle and end label positions of a stacked chart. 'visible'
+    # marks bands with a positive value in that row; with min_sep the start
+    # and end labels are spread apart, and in the middle only the smallest
+    # band's label is moved clear of the label below it.
+    values = np.asarray(values, dtype=float)
+    centres = stack_centres(values)
+    mid_index = len(values) // 2 if mid_index is None else mid_index
+
+    layout = {}
+    for name, row in (('start', 0), ('mid', mid_index), ('end', -1)):
+        visible = values[row] > 0
+        y = centres[row].copy()
+        if min_sep is not None and name != 'mid':
+            y[visible] = spread_labels(y[visible], min_sep)
+        layout[name] = {'row': row, 'y': y, 'visible': visible, 'values': values[row]}
+
+    if min_sep is not None:
+        mid = layout['mid']
+        smallest = np.argmin(mid['values'])
+        mid['visible'][smallest] = True
+        mid['y'][smallest] -= min(mid['values'][smallest], 0.0) / 2
+        drawn = np.flatnonzero(mid['visible'])
+        mid['y'][drawn] = spread_labels(mid['y'][drawn], min_sep, drawn == smallest)
+    return layout
@@ -0,0 +1,47 @@
+from chart_output import chart_figure, fit_layout, render_chart, show  # picks the backend before pyplot loads
+from employment_by_sector_by_sex import sex_title_map
+from gva_by_sector_vs_workforce_size_by_sector import sector_color_dict
+from gva_employment_panel import load_panel, productivity_frame
+from sectors import a10_groups
+
+# === File paths ===
+path_gdp = '[file path]'
+path_employment = '[file path]'
+selected_sex = 'Ambos sexos'
+
+
+# === Plotting function ===
+def _setup_axes(fig, ax):
+    ax.set_ylabel('GVA per Worker (€ Thousands)', fontsize=12)
+    ax.set_xlabel('Year', fontsize=12)
+
+
+def plot_productivity_over_time(productivity, sex=selected_sex):
+    fig, ax = chart_figure('productivity_over_time', (12, 8), _setup_axes)
+    sectors = productivity.drop(columns='Total Economy').dropna(axis=1, how='all').columns
+    for code in sectors:
+        label = a10_groups[code][1]
+        ax.plot(productivity.index, productivity[code], marker='o', markersize=3, linewidth=1.5,
+                color=sector_color_dict[label], label=label)
+
+    ax.plot(productivity.index, productivity['Total Economy'], color=sector_color_dict['Total Economy'],
+            linestyle='--', linewidth=2, label='Total Economy')
+
+    # === Axes, legend ===
+    ax.set_xticks(range(productivity.index.min(), productivity.index.max() + 1, 2))
+    ax.set_title(f'Labour Productivity by Sector in Spain over Time ({sex_title_map.get(sex, sex)})', fontsize=14)
+    ax.grid(True, linestyle=':', linewidth=0.5)
+    ax.legend(title='Sectors', loc='upper left', bbox_to_anchor=(1.01, 1))
+
+    fit_layout(fig)
+    return fig
+
+
+if __name__ == '__main__':
+    # === One panel for every year, one line per sector ===
+    panel = load_panel(path_gdp, path_employment, sexes=[selected_sex])
+    productivity = productivity_frame(panel, selected_sex)
+    print(productivity.round(1))
+
+    render_chart('labour_productivity_over_time', plot_productivity_over_time, productivity, selected_sex)
+    show()
@@ -0,0 +1,201 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# === Stage profiling ===
+# CHARTS_PROFILE=1 times the named stages of a run (read_csv, number decoding,
+# cube building, slicing, rendering, saving) with row counts and peak memory,
+# and reports them at exit: as JSON to CHARTS_PROFILE_REPORT when set, as a
+# summary on stderr otherwise. CHARTS_PROFILE_CPROFILE=path also dumps a
+# cProfile of the whole run. When disabled a stage is a shared no-op object.
+enabled = os.environ.get('CHARTS_PROFILE', '0') == '1'
+report_path = os.environ.get('CHARTS_PROFILE_REPORT')
+cprofile_path = os.environ.get('CHARTS_PROFILE_CPROFILE')
+
+stages = {}
+events = []
+started = time.perf_counter()
+_profiler = None
+_registered = False
+_lock = threading.Lock()
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+def record(name, seconds, rows=None, label=None, peak_before=None):
+    peak = peak_rss_mb()
+    with _lock:  # stages may finish on several loader threads at once
+        entry = stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'rows': 0, 'peak_rss_mb': None,
+                                         'peak_growth_mb': 0.0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['rows'] += rows or 0
+        if peak is not None:
+            entry['peak_rss_mb'] = peak
+            entry['peak_growth_mb'] += peak - (peak_before or peak)
+        events.append({'stage': name, 'label': label, 'seconds': round(seconds, 6), 'rows': rows})
+
+
+class _Stage:
+    # A stage entered while the same stage is already running in the same
+    # thread (a profiled function calling another one) is folded into the
+    # outer one
+    __slots__ = ('name', 'label', 'rows', 'start', 'peak', 'nested')
+    local = threading.local()
+
+    def __init__(self, name, label=None):
+        self.name = name
+        self.label = label
+        self.rows = None
+
+    def count(self, rows):
+        self.rows = (self.rows or 0) + rows
+
+    @staticmethod
+    def active():
+        if not hasattr(_Stage.local, 'names'):
+            _Stage.local.names = set()
+        return _Stage.local.names
+
+    def __enter__(self):
+        active = _Stage.active()
+        self.nested = self.name in active
+        active.add(self.name)
+        self.peak = peak_rss_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.nested:
+            _Stage.active().discard(self.name)
+            record(self.name, time.perf_counter() - self.start, self.rows, self.label, self.peak)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def count(self, rows):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+null_stage = _NullStage()
+
+
+def stage(name, label=None):
+    # with stage('load.read_csv') as s: df = ...; s.count(len(df))
+    return _Stage(name, label) if enabled else null_stage
+
+
+def profiled(name):
+    # Decorator form of stage() for whole functions
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Stage(name, function.__qualname__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# === Worker processes ===
+# Pool workers never run the atexit report: each one turns profiling on for
+# its share of the work, hands back what it recorded with collect(), and the
+# parent folds that into its own report with merge().
+def start_worker():
+    # Stages a forked worker inherited from the parent are dropped, so they
+    # are not counted twice
+    global enabled
+    enabled = True
+    collect()
+
+
+def collect():
+    # Stages and events recorded so far in this process, then cleared
+    with _lock:
+        data = {'stages': dict(stages), 'events': list(events)}
+        stages.clear()
+        events.clear()
+    return data
+
+
+def merge(data):
+    with _lock:
+        for name, other in data['stages'].items():
+            entry = stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'rows': 0, 'peak_rss_mb': None,
+                                             'peak_growth_mb': 0.0})
+            for key in ('calls', 'seconds', 'rows', 'peak_growth_mb'):
+                entry[key] += other[key]
+            if other['peak_rss_mb'] is not None:
+                entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0.0, other['peak_rss_mb'])
+        events.extend(data['events'])
+
+
+# === Reporting ===
+def report():
+    return {'argv': sys.argv, 'wall_seconds': time.perf_counter() - started,
+            'peak_rss_mb': peak_rss_mb(), 'stages': stages, 'events': events}
+
+
+def write_report(path=None):
+    data = report()
+    if path:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1)
+        print(f"[profile] report written to {path}", file=sys.stderr)
+        return data
+
+    print(f"[profile] {data['wall_seconds']:.2f}s wall, peak RSS {data['peak_rss_mb'] or 0:.0f} MB",
+          file=sys.stderr)
+    for name, entry in sorted(stages.items(), key=lambda item: -item[1]['seconds']):
+        print(f"[profile] {name:<22} {entry['seconds']:8.3f}s  {entry['calls']:4d} calls  "
+              f"{entry['rows']:>10,} rows  +{entry['peak_growth_mb']:.0f} MB", file=sys.stderr)
+    return data
+
+
+def _finish():
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(cprofile_path)
+    write_report(report_path)
+
+
+def enable(report=None, cprofile=None):
+    # Turns profiling on for the rest of the process, e.g. from a --profile flag
+    global enabled, report_path, cprofile_path, _profiler, _registered
+    enabled = True
+    report_path = report or report_path
+    cprofile_path = cprofile or cprofile_path
+    if cprofile_path and _profiler is None:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if not _registered:
+        atexit.register(_finish)
+        _registered = True
+
+
+if enabled:
+    enable()
@@ -0,0 +1,325 @@
+import argparse
+import importlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import chart_output
+import profiling
+chart_output.use_headless()  # batch runs never open a window
+
+from chart_output import render_chart, variant_name
+from gva_employment_panel import build_panel, panel_frame, productivity_frame
+from ine_cube import load_ine_cubes, region_axis
+from small_multiples import pages
+import employment_by_sector_by_sex as employment_pie
+import employment_by_sector_by_sex_over_time as employment_over_time
+import employment_by_sector_by_region as employment_regions
+import gva_by_sector as gva_pie
+import gva_by_sector_over_time as gva_over_time
+import gva_by_sector_vs_workforce_size_by_sector as gva_vs_workforce
+import labour_productivity_by_sector_vs_workforce_size_by_sector as productivity_vs_workforce
+import labour_productivity_over_time as productivity_over_time
+
+# === Render matrix ===
+# A spec lists the source files, the charts to draw and the variants to draw
+# them for. Every source is reduced once to its annual cube and every chart
+# variant is a slice of it; only the rendering is spread over workers.
+#
+# {
+#   "sources": {"employment": "...", "employment_shares": "...",
+#               "employment_regions": "...", "gva": "...",
+#               "national_accounts": "..."},
+#   "charts": ["employment_pie", "employment_over_time", "gva_pie",
+#              "gva_over_time", "gva_vs_workforce", "productivity_vs_workforce",
+#              "productivity_over_time", "employment_regions_over_time",
+#              "employment_regions_pie"],
+#   "sexes": ["Ambos sexos", "Hombres", "Mujeres"],
+#   "years": [2023, 2024],
+#   "thresholds": [2.5, 3],
+#   "regions_per_figure": null,
+#   "resolution": "annual",
+#   "smoothing": null,
+#   "output_dir": "charts",
+#   "formats": ["png", "svg", "pdf"],
+#   "workers": null,
+#   "backend": null
+# }
+#
+# 'employment_shares' and 'employment_regions' fall back to 'employment' and
+# 'national_accounts' to 'gva' when the same file holds both; the regional
+# charts are skipped when their table has no region column. Charts ignore the dimensions they do
+# not use, and 'years' defaults to the latest year of each table. 'formats'
+# also takes the output profiles of chart_output ('web', 'print', 'slides').
+# 'resolution': 'quarterly' keeps every quarter in employment_over_time,
+# optionally smoothed ('rolling4' or 'centred', see smoothing.py).
+# 'backend' picks the library that builds the cubes ('pandas' or 'polars',
+# default INE_BACKEND, see ine_cube.cube_backends).
+
+chart_sources = {
+    'employment_pie': ['employment'],
+    'employment_over_time': ['employment_shares', 'employment'],
+    'gva_pie': ['gva'],
+    'gva_over_time': ['gva'],
+    'gva_vs_workforce': ['national_accounts', 'employment'],
+    'productivity_vs_workforce': ['national_accounts', 'employment'],
+    'productivity_over_time': ['national_accounts', 'employment'],
+    'employment_regions_over_time': ['employment_regions'],
+    'employment_regions_pie': ['employment_regions'],
+}
+source_fallbacks = {'employment_shares': 'employment', 'employment_regions': 'employment',
+                    'national_accounts': 'gva'}
+
+# Tasks are sent to the workers in contiguous batches, a few per worker
+batches_per_worker = 4
+
+
+# === Loading ===
+def load_sources(sources, needed, sexes=None, backend=None):
+    # Each distinct file is reduced to a cube (or read from the cache) exactly
+    # once, all of them concurrently, by the given cube backend. Employment
+    # cubes only keep the rows of the requested sexes.
+    by_path = {}
+    keys = {}
+    for name in needed:
+        path = sources.get(name) or sources.get(source_fallbacks.get(name))
+        if path is None:
+            raise ValueError(f"Spec is missing the '{name}' source")
+        where = {'Sexo': sexes} if sexes and name.startswith('employment') else None
+        keys[name] = (path, bool(where))
+        by_path.setdefault(keys[name], {'file_path': path, 'where': where, 'backend': backend})
+    cubes = load_ine_cubes(by_path)
+    return {name: cubes[key] for name, key in keys.items()}
+
+
+def _task(module, function, args, name):
+    return {'module': module.__name__, 'function': function, 'args': args, 'name': name}
+
+
+def _slice(series, key):
+    try:
+        return series.loc[key]
+    except KeyError:
+        print(f"Skipping {key}: not in the data")
+        return None
+
+
+# === Shared aggregates and task lists, one builder per chart type ===
+def employment_pie_tasks(cubes, spec, shared):
+    cube = cubes['employment']
+    for sex in spec.get('sexes') or [employment_pie.selected_sex]:
+        sector_means = employment_pie.sex_sector_means(cube, sex)
+        for year in spec.get('years') or [sector_means.index.max()]:
+            data = _slice(sector_means, int(year))
+            if data is None:
+                continue
+            for threshold in spec.get('thresholds') or [employment_pie.threshold]:
+                yield _task(employment_pie, 'plot_employment_pie', (data.dropna(), sex, str(year), threshold),
+                            variant_name('employment_pie', sex=sex, year=year, threshold=threshold))
+
+
+def employment_over_time_tasks(cubes, spec, shared):
+    resolution = spec.get('resolution') or 'annual'
+    smoothing = spec.get('smoothing')
+    for sex in spec.get('sexes') or [employment_over_time.sexo]:
+        pivot_abs_df, pivot_pct_df = employment_over_time.sex_pivots(
+            cubes['employment_shares'], cubes['employment'], sex, resolution, smoothing)
+        for threshold in spec.get('thresholds') or [employment_over_time.threshold]:
+            for part in ('above', 'below'):
+                yield _task(employment_over_time, 'plot_sector_split',
+                            (pivot_abs_df, pivot_pct_df, sex, threshold, part, smoothing),
+                            variant_name('employment_over_time', sex=sex,
+                                         resolution=employment_over_time.resolution_name(resolution, smoothing),
+                                         threshold=threshold, part=part))
+
+
+def gva_pie_tasks(cubes, spec, shared):
+    sector_vab = gva_pie.annual_sector_vab(cubes['gva'])
+    for year in spec.get('years') or [sector_vab.index.max()]:
+        data = _slice(sector_vab, int(year))
+        if data is not None:
+            yield _task(gva_pie, 'plot_gva_pie', (data.dropna(), int(year)), variant_name('gva_pie', year=year))
+
+
+def gva_over_time_tasks(cubes, spec, shared):
+    pivot_abs, pivot_pct = gva_over_time.gva_pivots(cubes['gva'])
+    for threshold in spec.get('thresholds') or [gva_over_time.threshold]:
+        for part in ('major', 'minor'):
+            yield _task(gva_over_time, 'plot_gva_split', (pivot_abs, pivot_pct, threshold, part),
+                        variant_name('gva_over_time', threshold=threshold, part=part))
+
+
+def _gva_employment_panel(cubes, spec, shared):
+    # One GVA / employment panel for every year and sex, shared by the
+    # scatter and productivity charts
+    available = cubes['employment']['labels']['Sexo']
+    sexes = [sex for sex in spec.get('sexes') or [productivity_vs_workforce.selected_sex] if sex in available]
+    key = ('gva_employment',) + tuple(sexes)
+    if key not in shared:
+        for sex in set(spec.get('sexes') or []) - set(available):
+            print(f"Skipping {sex}: not in the data")
+        shared[key] = build_panel(cubes['national_accounts'], cubes['employment'], sexes)
+    return shared[key]
+
+
+def _scatter_tasks(chart, module, plot, cubes, spec, shared):
+    panel = _gva_employment_panel(cubes, spec, shared)
+    for year in spec.get('years') or [max(panel['years'])]:
+        if int(year) not in panel['years']:
+            print(f"Skipping {year}: not in the data")
+            continue
+        for sex in panel['sexes']:
+            yield _task(module, plot, (panel_frame(panel, year, sex), int(year)),
+                        variant_name(chart, sex=sex, year=year))
+
+
+def gva_vs_workforce_tasks(cubes, spec, shared):
+    return _scatter_tasks('gva_vs_workforce', gva_vs_workforce, 'plot_gva_vs_workforce', cubes, spec, shared)
+
+
+def productivity_vs_workforce_tasks(cubes, spec, shared):
+    return _scatter_tasks('productivity_vs_workforce', productivity_vs_workforce,
+                          'plot_productivity_vs_workforce', cubes, spec, shared)
+
+
+def productivity_over_time_tasks(cubes, spec, shared):
+    panel = _gva_employment_panel(cubes, spec, shared)
+    for sex in panel['sexes']:
+        yield _task(productivity_over_time, 'plot_productivity_over_time', (productivity_frame(panel, sex), sex),
+                    variant_name('productivity_over_time', sex=sex))
+
+
+def _region_frames(cubes, spec, shared, sex):
+    # Every region's sector means of one sex, shared by the regional charts
+    cube = cubes['employment_regions']
+    if region_axis(cube) is None:
+        if ('employment_regions',) not in shared:
+            print("Skipping the regional charts: the table has no region column")
+            shared[('employment_regions',)] = None
+        return None
+    key = ('employment_regions', sex)
+    if key not in shared:
+        if sex not in cube['labels']['Sexo']:
+            print(f"Skipping {sex}: not in the data")
+            shared[key] = None
+        else:
+            shared[key] = employment_regions.region_sector_means(cube, sex)
+    return shared[key]
+
+
+def _region_pages(frames, spec):
+    per_page = spec.get('regions_per_figure')
+    for page, chunk in enumerate(pages(frames, per_page), start=1):
+        yield (page if per_page else None), chunk
+
+
+def employment_regions_over_time_tasks(cubes, spec, shared):
+    for sex in spec.get('sexes') or [employment_regions.selected_sex]:
+        frames = _region_frames(cubes, spec, shared, sex)
+        if not frames:
+            continue
+        for page, chunk in _region_pages(frames, spec):
+            yield _task(employment_regions, 'plot_regions_over_time', (chunk, sex),
+                        variant_name('employment_regions_over_time', sex=sex, page=page))
+
+
+def employment_regions_pie_tasks(cubes, spec, shared):
+    for sex in spec.get('sexes') or [employment_regions.selected_sex]:
+        frames = _region_frames(cubes, spec, shared, sex)
+        if not frames:
+            continue
+        for year in spec.get('years') or [employment_regions.latest_year(frames)]:
+            for page, chunk in _region_pages(frames, spec):
+                yield _task(employment_regions, 'plot_regions_pie', (chunk, sex, int(year)),
+                            variant_name('employment_regions_pie', sex=sex, year=year, page=page))
+
+
+task_builders = {
+    'employment_pie': employment_pie_tasks,
+    'employment_over_time': employment_over_time_tasks,
+    'gva_pie': gva_pie_tasks,
+    'gva_over_time': gva_over_time_tasks,
+    'gva_vs_workforce': gva_vs_workforce_tasks,
+    'productivity_vs_workforce': productivity_vs_workforce_tasks,
+    'productivity_over_time': productivity_over_time_tasks,
+    'employment_regions_over_time': employment_regions_over_time_tasks,
+    'employment_regions_pie': employment_regions_pie_tasks,
+}
+
+
+# === Worker ===
+def render_task(task, output_dir, formats):
+    plot = getattr(importlib.import_module(task['module']), task['function'])
+    return render_chart(task['name'], plot, *task['args'],
+                        directory=output_dir, formats=formats, close=True)
+
+
+def render_batch(tasks, output_dir, formats, profile=False):
+    # A run of consecutive tasks (mostly of one chart type, so templates are
+    # reused); background saves overlap with drawing the next chart. With
+    # 'profile' the batch's stage timings come back with the written paths.
+    if profile:
+        profiling.start_worker()
+    written = [path for task in tasks for path in render_task(task, output_dir, formats)]
+    chart_output.wait_for_saves()
+    return written, profiling.collect() if profile else None
+
+
+# === Driver ===
+def build_tasks(spec):
+    charts = spec.get('charts') or list(task_builders)
+    unknown = [c for c in charts if c not in task_builders]
+    if unknown:
+        raise ValueError(f"Unknown chart types: {', '.join(unknown)}")
+
+    needed = dict.fromkeys(name for chart in charts for name in chart_sources[chart])
+    cubes = load_sources(spec.get('sources', {}), needed, spec.get('sexes'), spec.get('backend'))
+    shared = {}
+    return [task for chart in charts for task in task_builders[chart](cubes, spec, shared)]
+
+
+def run(spec, workers=None):
+    output_dir = spec.get('output_dir', 'charts')
+    formats = spec.get('formats') or chart_output.output_formats
+
+    start = time.perf_counter()
+    tasks = build_tasks(spec)
+    print(f"Prepared {len(tasks)} charts in {time.perf_counter() - start:.2f}s")
+
+    workers = workers or spec.get('workers') or os.cpu_count()
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        size = max(1, -(-len(tasks) // (workers * batches_per_worker)))
+        futures = [pool.submit(render_batch, tasks[i:i + size], output_dir, formats, profiling.enabled)
+                   for i in range(0, len(tasks), size)]
+        for future in as_completed(futures):
+            paths, stages = future.result()
+            written.extend(paths)
+            if stages:
+                profiling.merge(stages)
+
+    print(f"Wrote {len(written)} files with {workers} workers in {time.perf_counter() - start:.2f}s")
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render every chart variant listed in a spec file.')
+    parser.add_argument('spec', help='JSON render matrix spec')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--templates', action='store_true',
+                        help='reuse one figure per chart type in each worker (fixed layout)')
+    parser.add_argument('--background-save', action='store_true',
+                        help='write files on a separate thread while the next chart is drawn')
+    parser.add_argument('--profile', nargs='?', const='', metavar='REPORT',
+                        help='time each stage, in this process and the workers; optional JSON report path')
+    args = parser.parse_args()
+    if args.profile is not None:
+        profiling.enable(report=args.profile or None)
+    if args.templates:
+        chart_output.use_templates()
+    if args.background_save:
+        chart_output.use_background_saves()
+
+    with open(args.spec) as f:
+        run(json.load(f), workers=args.workers)
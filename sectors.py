@@ -0,0 +1,133 @@
+import re
+
+import numpy as np
+
+# === Shared sector dictionary ===
+# One entry per sector code as it appears at the start of the INE labels:
+# code: (Spanish label, English label, colour)
+
+# CNAE 2009 sections, as used by the EPA employment tables
+cnae_sections = {
+    'A': ('A Agricultura, ganadería, silvicultura y pesca', 'Agriculture & Fishing', '#8FBC8F'),
+    'B': ('B Industrias extractivas', 'Extractive Industries', '#DAA520'),
+    'C': ('C Industria manufacturera', 'Manufacturing', '#4682B4'),
+    'D': ('D Suministro de energía eléctrica, gas, vapor y aire acondicionado', 'Energy Supply', '#B22222'),
+    'E': ('E Suministro de agua, actividades de saneamiento, gestión de residuos y descontaminación', 'Water & Waste', '#20B2AA'),
+    'F': ('F Construcción', 'Construction', '#D2691E'),
+    'G': ('G Comercio al por mayor y al por menor; reparación de vehículos de motor y motocicletas', 'Trade & Repair', '#FFD700'),
+    'H': ('H Transporte y almacenamiento', 'Transport & Storage', '#708090'),
+    'I': ('I Hostelería', 'Hospitality', '#FF8C00'),
+    'J': ('J Información y comunicaciones', 'Information & Comms', '#00CED1'),
+    'K': ('K Actividades financieras y de seguros', 'Finance & Insurance', '#000080'),
+    'L': ('L Actividades inmobiliarias', 'Real Estate', '#BC8F8F'),
+    'M': ('M Actividades profesionales, científicas y técnicas', 'Professional & Technical', '#9932CC'),
+    'N': ('N Actividades administrativas y servicios auxiliares', 'Administrative Services', '#A0522D'),
+    'O': ('O Administración Pública y defensa; Seguridad Social obligatoria', 'Public Administration', '#2E8B57'),
+    'P': ('P Educación', 'Education', '#1E90FF'),
+    'Q': ('Q Actividades sanitarias y de servicios sociales', 'Health & Social Services', '#FF69B4'),
+    'R': ('R Actividades artísticas, recreativas y de entretenimiento', 'Arts & Entertainment', '#DB7093'),
+    'S': ('S Otros servicios', 'Other Services', '#696969'),
+    'T': ('T Actividades de los hogares como empleadores de personal doméstico; actividades de los hogares como productores de bienes y servicios para uso propio', 'Household Activities', '#778899'),  # light slate gray
+    'U': ('U Actividades de organizaciones y organismos extraterritoriales', 'Extraterritorial Organizations', '#556B2F'),  # dark olive green
+}
+
+# CNAE A10 groupings, as used by the national accounts (GVA) tables
+a10_groups = {
+    'A': ('A Agricultura, ganadería, silvicultura y pesca', 'Agriculture & Fishing', '#8FBC8F'),
+    'BDE': ('BDE Industrias extractivas; suministro de energía eléctrica, gas, vapor y aire acondicionado; suministro de agua, actividades de saneamiento, gestión de residuos y descontaminación', 'Extractive, Energy, Water & Waste', '#DAA520'),
+    'C': ('C Industria manufacturera', 'Manufacturing', '#4682B4'),
+    'F': ('F Construcción', 'Construction', '#D2691E'),
+    'GHI': ('GHI Comercio al por mayor y al por menor; reparación de vehículos de motor y motocicletas; transporte y almacenamiento; hostelería', 'Trade, Transport & Hospitality', '#FFD700'),
+    'J': ('J Información y comunicaciones', 'Information & Comms', '#00CED1'),
+    'K': ('K Actividades financieras y de seguros', 'Finance & Insurance', '#000080'),
+    'L': ('L Actividades inmobiliarias', 'Real Estate', '#BC8F8F'),
+    'MN': ('MN Actividades profesionales, científicas y técnicas; actividades administrativas y servicios auxiliares', 'Professional & Admin Services', '#9932CC'),
+    'OPQ': ('OPQ Administración pública y defensa; seguridad social obligatoria; educación; actividades sanitarias y de servicios sociales', 'Public Services (Admin, Education, Health)', '#2E8B57'),
+    'RSTU': ('RSTU Actividades artísticas, recreativas y de entretenimiento; otras actividades de servicios; actividades de los hogares como empleadores de personal doméstico; actividades de los hogares como productores de bienes y servicios para uso propio', 'Arts, Other & Household Services', '#DB7093'),
+}
+
+# CNAE 2009 section -> A10 group used by the GVA tables
+cnae_to_a10 = {
+    'A': 'A',
+    'B': 'BDE', 'C': 'C', 'D': 'BDE', 'E': 'BDE',
+    'F': 'F',
+    'G': 'GHI', 'H': 'GHI', 'I': 'GHI',
+    'J': 'J', 'K': 'K', 'L': 'L',
+    'M': 'MN', 'N': 'MN',
+    'O': 'OPQ', 'P': 'OPQ', 'Q': 'OPQ',
+    'R': 'RSTU', 'S': 'RSTU', 'T': 'RSTU', 'U': 'RSTU',
+}
+
+# Row holding the whole economy in the EPA tables
+total_code = 'Total'
+default_color = '#CCCCCC'
+
+# Label columns that carry a sector code, in the order they are looked up
+sector_columns = ['Rama de actividad CNAE 2009', 'CNAE Agrupación A10']
+code_pattern = re.compile(r'^([A-Z]+)\s')
+
+
+# === Code lookups ===
+def sector_code(label):
+    match = code_pattern.match(label.strip())
+    return match.group(1) if match else label.strip()
+
+
+def sector_dictionary(codes):
+    # The CNAE sections or the A10 groups, whichever the codes belong to
+    codes = set(codes) - {total_code}
+    if codes <= set(cnae_sections):
+        return cnae_sections
+    if codes <= set(a10_groups):
+        return a10_groups
+    return max((cnae_sections, a10_groups), key=lambda sectors: len(codes & set(sectors)))
+
+
+def translate_sector(code, sectors=cnae_sections):
+    return sectors[code][1] if code in sectors else code
+
+
+def sector_color(code, sectors=cnae_sections, default=default_color):
+    return sectors[code][2] if code in sectors else default
+
+
+# === CNAE 2009 section <-> A10 group positions ===
+# section_codes[i] belongs to group_codes[section_group[i]], so regrouping
+# section data is an index operation instead of a per-row lookup or a merge
+# on string keys.
+section_codes = list(cnae_sections)
+group_codes = list(a10_groups)
+section_group = np.array([group_codes.index(cnae_to_a10[code]) for code in section_codes])
+group_labels = np.array([en for _, en, _ in a10_groups.values()])
+group_colors = np.array([color for _, _, color in a10_groups.values()])
+
+
+def code_positions(codes, reference):
+    # Position of every code in 'reference', -1 where it is absent (e.g. Total)
+    lookup = {code: i for i, code in enumerate(reference)}
+    return np.array([lookup.get(code, -1) for code in codes], dtype=int)
+
+
+def align_codes(values, codes, reference):
+    # Last-axis columns labelled 'codes', rearranged to follow 'reference';
+    # NaN where a reference code has no column
+    positions = code_positions(reference, codes)
+    aligned = np.take(np.asarray(values, dtype=float), positions, axis=-1)
+    aligned[..., positions < 0] = np.nan
+    return aligned
+
+
+def sections_to_groups(values, codes):
+    # Sums CNAE section columns (last axis, labelled 'codes') into A10 groups.
+    # Missing cells count as zero; a group with no data at all stays NaN.
+    values = np.asarray(values, dtype=float)
+    positions = code_positions(codes, section_codes)
+    keep = positions >= 0
+    groups = section_group[positions[keep]]
+    present = ~np.isnan(values[..., keep])
+
+    totals = np.zeros(values.shape[:-1] + (len(group_codes),))
+    counts = np.zeros(totals.shape, dtype=int)
+    np.add.at(totals.T, groups, np.where(present, values[..., keep], 0.0).T)
+    np.add.at(counts.T, groups, present.T)
+    return np.where(counts > 0, totals, np.nan)
@@ -0,0 +1,76 @@
+import math
+
+from profiling import stage
+
+# === Small multiples ===
+# One panel per label (a region, a sex, ...) in a grid that shares its axes,
+# its palette and a single legend. Panels are drawn by a callback, so any
+# chart type can be tiled. Margins are fixed from the grid size instead of
+# running tight_layout, whose cost grows with every axes in the figure.
+# pages() splits long lists into a tiled set of figures.
+panel_title_size = 9
+title_height = 0.6   # inches above the grid
+# Legend entries at 8 pt, in inches: swatch plus padding, one character of
+# label, one row; the legend wraps to as many rows as the figure width needs
+legend_entry_width = 0.5
+legend_char_width = 0.055
+legend_row_height = 0.19
+legend_margin = 0.3
+
+
+def grid_shape(count, ncols):
+    ncols = max(1, min(count, ncols))
+    return math.ceil(count / ncols), ncols
+
+
+def pages(panels, per_page=None):
+    # [{label: data}, ...] of at most per_page panels each, in order
+    items = list(panels.items())
+    per_page = per_page or len(items) or 1
+    return [dict(items[i:i + per_page]) for i in range(0, len(items), per_page)]
+
+
+def legend_shape(labels, width):
+    # (columns, rows) of a legend of these labels that fits the width
+    entry = legend_entry_width + legend_char_width * max(len(str(label)) for label in labels)
+    ncol = max(1, min(len(labels), int((width - 2 * legend_margin) // entry)))
+    return ncol, math.ceil(len(labels) / ncol)
+
+
+def plot_small_multiples(panels, draw, title, legend=None, ncols=5, panel_size=(3.2, 2.4),
+                         sharex=True, sharey=True):
+    # panels: {label: data}; draw(ax, label, data) fills one panel;
+    # legend: {label: colour} for the shared legend
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+
+    nrows, ncols = grid_shape(len(panels), ncols)
+    width = panel_size[0] * ncols
+    bottom = legend_margin
+    if legend:
+        legend_cols, legend_rows = legend_shape(list(legend), width)
+        bottom += legend_rows * legend_row_height + 0.3  # x tick labels above it
+    height = panel_size[1] * nrows + title_height + bottom
+    fig, axes = plt.subplots(nrows, ncols, figsize=(width, height), sharex=sharex, sharey=sharey,
+                             squeeze=False)
+
+    for ax, (label, data) in zip(axes.flat, panels.items()):
+        draw(ax, label, data)
+        ax.set_title(label, fontsize=panel_title_size)
+        ax.tick_params(labelsize=8)
+
+    # Empty cells of the last row: hide them and give the panels above
+    # back the x tick labels that sharing took away
+    for i in range(len(panels), nrows * ncols):
+        axes.flat[i].set_visible(False)
+        if sharex and i >= ncols:
+            axes.flat[i - ncols].xaxis.set_tick_params(labelbottom=True)
+
+    fig.suptitle(title, fontsize=14, y=1 - 0.25 / height)
+    if legend:
+        handles = [Patch(color=color, label=label) for label, color in legend.items()]
+        fig.legend(handles=handles, loc='lower center', ncol=legend_cols, fontsize=8, frameon=False)
+    with stage('render.layout'):
+        fig.subplots_adjust(left=0.6 / width, right=1 - 0.2 / width, top=1 - title_height / height,
+                            bottom=bottom / height, hspace=0.35, wspace=0.1)
+    return fig
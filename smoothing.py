@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# === Moving averages over period x series tables ===
+# Each method is a fixed kernel applied down the period axis of the whole
+# matrix at once: a strided window view of every position, multiplied by the
+# kernel, so all sectors are smoothed in one array operation. Periods whose
+# window runs past either end of the table are dropped, and a window that
+# touches a missing value gives a missing value.
+smoothing_methods = {
+    'rolling4': {'kernel': np.full(4, 1 / 4), 'align': 'trailing', 'label': 'rolling 4-quarter mean'},
+    # The 2x4 moving average: centred on a quarter, every season weighted equally
+    'centred': {'kernel': np.array([1, 2, 2, 2, 1]) / 8, 'align': 'centred', 'label': 'centred moving average'},
+}
+
+
+def convolve_rows(values, kernel):
+    # Kernel applied down axis 0 of a (period, series) array; one row per
+    # complete window
+    values = np.asarray(values, dtype=float)
+    if len(values) < len(kernel):
+        return np.empty((0,) + values.shape[1:])
+    return sliding_window_view(values, len(kernel), axis=0) @ kernel[::-1]
+
+
+def smooth_frame(frame, method):
+    # Period x series frame smoothed with one of smoothing_methods, on the
+    # periods every window fits in
+    if method is None:
+        return frame
+    if method not in smoothing_methods:
+        raise ValueError(f"Unknown smoothing: {method} (choose from {', '.join(smoothing_methods)})")
+    kernel = smoothing_methods[method]['kernel']
+    start = len(kernel) - 1 if smoothing_methods[method]['align'] == 'trailing' else len(kernel) // 2
+    values = convolve_rows(frame.to_numpy(dtype=float), kernel)
+    return pd.DataFrame(values, index=frame.index[start:start + len(values)], columns=frame.columns)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules are scripts at the top of the repo, and the synthetic INE
+# extracts live next to the benchmarks
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root, os.path.join(root, 'benchmarks')]
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import render_matrix
+from ine_cube import annual_frame
+from sectors import total_code
+from synthetic_ine import employment_table, gva_table, write_tsv
+
+# Sanity checks on the frames every chart of the render matrix is drawn
+# from: the whole-economy Total row is never plotted as a sector, and the
+# shares a chart stacks add up to about 100.
+share_tolerance = 1.5  # synthetic shares are rounded to 0.1 for each of 21 sectors
+
+
+@pytest.fixture(scope='module')
+def matrix(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('ine')
+    sources = {
+        'employment': write_tsv(employment_table(2019, 2024, gaps=0), directory / 'employment.tsv'),
+        'employment_regions': write_tsv(employment_table(2019, 2024, n_regions=3, gaps=0),
+                                        directory / 'employment_regions.tsv'),
+        'gva': write_tsv(gva_table(2010, 2023), directory / 'gva.tsv'),
+        'national_accounts': write_tsv(gva_table(2010, 2023, with_gdp=True), directory / 'national_accounts.tsv'),
+    }
+    spec = {'sources': sources, 'sexes': ['Ambos sexos', 'Mujeres'], 'thresholds': [3]}
+    needed = dict.fromkeys(name for names in render_matrix.chart_sources.values() for name in names)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(directory)  # the cube cache goes next to the data
+        cubes = render_matrix.load_sources(sources, needed, spec['sexes'])
+    shared = {}
+    tasks = {chart: list(builder(cubes, spec, shared)) for chart, builder in render_matrix.task_builders.items()}
+    return cubes, tasks
+
+
+def _frames(value):
+    # Every frame or series among a task's arguments
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _frames(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _frames(item)
+
+
+def _assert_shares(pct):
+    sums = pct.sum(axis=1).to_numpy()
+    assert np.allclose(sums, 100, atol=share_tolerance), sums
+
+
+def test_every_chart_has_variants(matrix):
+    _, tasks = matrix
+    assert all(tasks.values()), [chart for chart, chart_tasks in tasks.items() if not chart_tasks]
+
+
+def test_no_total_sector_in_plotted_frames(matrix):
+    _, tasks = matrix
+    for chart, chart_tasks in tasks.items():
+        for task in chart_tasks:
+            for frame in _frames(task['args']):
+                labels = frame.index if isinstance(frame, pd.Series) else frame.columns
+                assert total_code not in labels, task['name']
+                if 'Sector' in getattr(frame, 'columns', ()):
+                    assert total_code not in set(frame['Sector']), task['name']
+
+
+def test_stacked_shares_add_up_to_100(matrix):
+    _, tasks = matrix
+    for task in tasks['employment_over_time'] + tasks['gva_over_time']:
+        _assert_shares(task['args'][1])
+
+
+def test_pie_sectors_add_up_to_the_total(matrix):
+    cubes, tasks = matrix
+    for task in tasks['employment_pie']:
+        data, sex, year = task['args'][:3]
+        total = annual_frame(cubes['employment'], Sexo=sex, Unidad='Valor absoluto').loc[int(year), total_code]
+        assert data.sum() == pytest.approx(total, rel=0.01), task['name']
@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+
+import gva_by_sector as gva_pie
+import render_matrix
+from ine_cube import load_ine_cube
+from synthetic_ine import gva_table, write_tsv
+
+
+def test_gva_charts_on_a_table_with_gdp_and_gva(tmp_path):
+    # National accounts extracts hold GDP rows (with no A10 group) next to
+    # the GVA by sector; the GVA charts must draw the GVA rows only
+    path = write_tsv(gva_table(2015, 2023, with_gdp=True), tmp_path / 'national_accounts.tsv')
+    cubes = {'gva': load_ine_cube(path, cache=False)}
+
+    vab = gva_pie.annual_sector_vab(cubes['gva'])
+    expected = gva_table(2015, 2023)
+    totals = (expected['Total'].str.replace('.', '').str.replace(',', '.').astype(float)
+              .groupby(expected['Periodo'].astype(int)).sum())
+    assert np.allclose(vab.sum(axis=1).to_numpy(), totals.to_numpy())
+
+    tasks = (list(render_matrix.gva_pie_tasks(cubes, {}, {}))
+             + list(render_matrix.gva_over_time_tasks(cubes, {}, {})))
+    assert len(tasks) == 3
+    written = [path for task in tasks for path in render_matrix.render_task(task, str(tmp_path), ['png'])]
+    assert written and all(os.path.exists(path) for path in written)
@@ -0,0 +1,25 @@
+import os
+
+import pandas as pd
+
+from ine_loader import _read_cache, cache_path, load_ine_table, selection_key, source_fingerprint
+from synthetic_ine import employment_table, write_tsv
+
+
+def test_cached_table_with_columns_and_row_selection(tmp_path):
+    path = write_tsv(employment_table(2022, 2024), tmp_path / 'employment.tsv')
+    directory = str(tmp_path / 'cache')
+    load_ine_table(path, directory=directory)  # caches the full table
+
+    columns = ['Rama de actividad CNAE 2009', 'Total']
+    where, prefix = {'Sexo': 'Hombres'}, {'Periodo': '2023'}
+    full = cache_path(directory, source_fingerprint(path, directory))
+    cached = _read_cache(full, columns, where, prefix)
+    expected = load_ine_table(path, columns=columns, where=where, prefix=prefix, cache=False)
+    pd.testing.assert_frame_equal(cached, expected)
+
+    # Served from the full table's cache, not by re-reading the TSV
+    df = load_ine_table(path, columns=columns, where=where, prefix=prefix, directory=directory)
+    pd.testing.assert_frame_equal(df, cached)
+    selection = selection_key(columns, where, prefix)
+    assert not os.path.exists(cache_path(directory, source_fingerprint(path, directory), selection))
@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+
+from profiling import profiled
+from sectors import total_code
+
+# === Consistency checks on ingested cubes ===
+# Every cube that load_ine_cube hands out is checked with a handful of
+# whole-array reductions over its quarterly values and cell counts, so the
+# checks cost milliseconds and stay on in every run:
+#
+#   missing      cells with no value ('..' or no row) inside the periods and
+#                sectors the table does cover; fillna(0) downstream would
+#                otherwise turn them into silent zeros
+#   duplicates   cells fed by more than one row of the same Periodo
+#   shares       'Porcentaje' sectors of a period not adding up to ~100
+#   totals       'Valor absoluto' sectors not adding up to the Total row
+#
+# The report is a small dict kept on the cube ('validation') plus one
+# [validate] line per table. INE_VALIDATE=0 turns the checks off and
+# INE_VALIDATE=strict raises on any issue instead of only reporting it.
+validate_mode = os.environ.get('INE_VALIDATE', '1')
+
+unit_axis = 'Unidad'
+share_unit = 'Porcentaje'
+absolute_unit = 'Valor absoluto'
+share_tolerance = 0.5     # percentage points away from 100
+total_tolerance = 0.005   # relative gap between the sector sum and Total
+max_examples = 3
+
+
+def _unit_values(cube, unit):
+    # (period, sector, *other axes) values of one unit; tables without a unit
+    # axis count as absolute values
+    values = cube['quarterly']
+    if unit_axis not in cube['axes']:
+        return values if unit == absolute_unit else None
+    labels = cube['labels'][unit_axis]
+    if unit not in labels:
+        return None
+    return np.take(values, labels.index(unit), axis=2 + cube['axes'].index(unit_axis))
+
+
+def _examples(cube, mask, names, **values):
+    # Labels of the first few flagged cells of a mask over the 'names' axes,
+    # with the given arrays' values at those cells
+    return [dict({name: cube['labels'][name][i] for name, i in zip(names, position)},
+                 **{key: round(float(array[tuple(position)]), 3) for key, array in values.items()})
+            for position in np.argwhere(mask)[:max_examples]]
+
+
+def _cell_axes(cube):
+    return ['Periodo', 'Sector code'] + cube['axes']
+
+
+def _sum_axes(cube):
+    # Axes left once the sectors are summed and one unit is picked
+    return ['Periodo'] + [axis for axis in cube['axes'] if axis != unit_axis]
+
+
+def _sector_sums(values, sectors):
+    # Sum of every sector but Total, per period and combination, and whether
+    # it can be checked: some sector has a value and none of the sectors the
+    # combination reports elsewhere is missing (gaps count as missing cells,
+    # not as a second issue here)
+    parts = values[:, [i for i, code in enumerate(sectors) if code != total_code]]
+    absent = np.isnan(parts)
+    gaps = (absent & ~absent.all(axis=0, keepdims=True)).any(axis=1)
+    return np.nansum(parts, axis=1), ~absent.all(axis=1) & ~gaps
+
+
+def check_missing(cube):
+    has = cube['quarterly_count'] > 0
+    missing = ~has & has.any(axis=1, keepdims=True) & has.any(axis=0, keepdims=True)
+    by_sector = missing.sum(axis=tuple(i for i in range(missing.ndim) if i != 1))
+    sectors = cube['labels']['Sector code']
+    return {'cells': int(missing.sum()), 'of': int(has.size),
+            'by_sector': {sectors[i]: int(n) for i, n in enumerate(by_sector) if n},
+            'examples': _examples(cube, missing, _cell_axes(cube))}
+
+
+def check_duplicates(cube):
+    duplicated = cube['quarterly_count'] > 1
+    periods = np.flatnonzero(duplicated.reshape(len(duplicated), -1).any(axis=1))
+    return {'cells': int(duplicated.sum()),
+            'periods': [cube['labels']['Periodo'][i] for i in periods[:max_examples]],
+            'examples': _examples(cube, duplicated, _cell_axes(cube))}
+
+
+def check_shares(cube):
+    values = _unit_values(cube, share_unit)
+    if values is None:
+        return None
+    sums, observed = _sector_sums(values, cube['labels']['Sector code'])
+    deviation = np.where(observed, np.abs(sums - 100), 0)
+    off = deviation > share_tolerance
+    return {'checked': int(observed.sum()), 'off': int(off.sum()), 'worst': float(deviation.max(initial=0)),
+            'examples': _examples(cube, off, _sum_axes(cube), sum=sums)}
+
+
+def check_totals(cube):
+    sectors = cube['labels']['Sector code']
+    values = _unit_values(cube, absolute_unit)
+    if values is None or total_code not in sectors:
+        return None
+    sums, observed = _sector_sums(values, sectors)
+    total = values[:, sectors.index(total_code)]
+    observed &= ~np.isnan(total)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gap = np.where(observed, np.abs(sums - total) / np.abs(total), 0)
+    off = gap > total_tolerance
+    return {'checked': int(observed.sum()), 'off': int(off.sum()), 'worst': float(gap.max(initial=0)),
+            'examples': _examples(cube, off, _sum_axes(cube), sum=sums, total=total)}
+
+
+def issue_count(report):
+    checks = [report['missing']['cells'], report['duplicates']['cells']]
+    checks += [report[name]['off'] for name in ('shares', 'totals') if report[name]]
+    return sum(checks)
+
+
+def summary(name, report):
+    parts = [f"{report['periods']} periods",
+             f"{report['missing']['cells']} missing cells",
+             f"{report['duplicates']['cells']} duplicated cells"]
+    if report['shares']:
+        parts.append(f"shares {report['shares']['off']}/{report['shares']['checked']} off 100 "
+                     f"(worst {report['shares']['worst']:.2f} pts)")
+    if report['totals']:
+        parts.append(f"totals {report['totals']['off']}/{report['totals']['checked']} off "
+                     f"(worst {report['totals']['worst']:.2%})")
+    return f"[validate] {name}: " + ', '.join(parts)
+
+
+@profiled('aggregate.validate')
+def validate_cube(cube):
+    report = {'periods': len(cube['labels']['Periodo']),
+              'missing': check_missing(cube), 'duplicates': check_duplicates(cube),
+              'shares': check_shares(cube), 'totals': check_totals(cube)}
+    report['issues'] = issue_count(report)
+    return report
+
+
+def checked(cube, name):
+    # The cube with its validation report, per INE_VALIDATE
+    if validate_mode == '0':
+        return cube
+    report = validate_cube(cube)
+    print(summary(name, report))
+    for check in ('missing', 'duplicates', 'shares', 'totals'):
+        for example in (report[check] or {}).get('examples', []):
+            print(f"[validate]   {check}: {example}")
+    if report['issues'] and validate_mode == 'strict':
+        raise ValueError(f"{name} failed validation with {report['issues']} issues")
+    cube['validation'] = report
+    return cube